@@ -12,6 +12,13 @@ def mock_media(settings):
         yield temp_directory
 
 
+@pytest.fixture(autouse=True)
+def thumbnail_workers(settings):
+    """Очередь миниатюр не разбирается фоновыми потоками: они делили бы
+    с тестом базу в памяти и его временный MEDIA_ROOT."""
+    settings.POSTS_THUMBNAIL_WORKERS = 0
+
+
 @pytest.fixture
 def mixer():
     return _mixer
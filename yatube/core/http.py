@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import re
+
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def byte_range(header, size):
+    """(начало, конец) из заголовка Range, None - отдавать файл целиком,
+    False - диапазон за пределами файла.
+
+    Поддерживается один диапазон: на несколько сразу отвечаем всем
+    файлом, это разрешено RFC 7233.
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    start, end = match.groups()
+    if start == "":
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request, path, content_type, etag, max_age=None):
+    """Отдает файл с диска с условными запросами и Range.
+
+    etag - строгий ETag (без кавычек), Last-Modified берется из mtime.
+    Файл целиком уходит через FileResponse, чтобы сервер мог отдать его
+    через wsgi.file_wrapper (sendfile) без копирования в Python.
+    """
+    stat = os.stat(path)
+    headers = {
+        "ETag": quote_etag(etag),
+        "Last-Modified": http_date(stat.st_mtime),
+        "Accept-Ranges": "bytes",
+    }
+    if max_age is not None:
+        headers["Cache-Control"] = f"public, max-age={max_age}, immutable"
+    base = HttpResponse()
+    for header, value in headers.items():
+        base[header] = value
+    conditional = get_conditional_response(
+        request,
+        etag=headers["ETag"],
+        last_modified=int(stat.st_mtime),
+        response=base,
+    )
+    if conditional is not base:
+        return conditional
+    requested = None
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if "HTTP_RANGE" in request.META and if_range in (None, headers["ETag"]):
+        requested = byte_range(request.META["HTTP_RANGE"], stat.st_size)
+    if requested is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+    elif requested:
+        start, end = requested
+        response = StreamingHttpResponse(
+            read_range(path, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def conditional_response(request, version, build):
+    """Ответ с ETag по version - JSON-описанию версии содержимого.
+
+    Если клиент прислал тот же ETag в If-None-Match, build() не
+    вызывается и уходит 304 без тела. no-cache заставляет клиентов и
+    прокси сверять ETag перед каждым использованием копии.
+    """
+    etag = quote_etag(
+        hashlib.md5(
+            json.dumps(version, sort_keys=True, default=str).encode()
+        ).hexdigest()
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    response["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
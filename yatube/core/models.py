@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import DatabaseError, models, transaction
 
 
 class CreatedModel(models.Model):
@@ -6,3 +6,40 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class CountersModel(models.Model):
+    """Модель с денормализованными счетчиками.
+
+    Счетчики меняются только атомарными F()-обновлениями, поэтому при
+    обычном сохранении уже существующей строки они не перезаписываются
+    значением из устаревшего экземпляра. Новая, удаленная или исчезнувшая
+    из базы строка сохраняется целиком, вместе со счетчиками.
+    """
+
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (
+            self._state.adding
+            or self.pk is None
+            or kwargs.get("update_fields") is not None
+            or kwargs.get("force_insert")
+        ):
+            return super().save(*args, **kwargs)
+        fields = [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.counter_fields
+        ]
+        try:
+            with transaction.atomic(using=kwargs.get("using")):
+                super().save(*args, update_fields=fields, **kwargs)
+        except DatabaseError:
+            # UPDATE не задел ни одной строки: ее удалили, вставляем заново.
+            if type(self)._base_manager.filter(pk=self.pk).exists():
+                raise
+            super().save(*args, **kwargs)
@@ -0,0 +1,31 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, around=2):
+    """Номера страниц для навигации: первая, последняя и ±around от текущей.
+
+    Пропуски между ними обозначены None. Если число страниц оценочное,
+    последняя не показывается.
+    """
+    paginator = page_obj.paginator
+    last = paginator.num_pages
+    current = page_obj.number
+    estimated = getattr(paginator, "is_estimated", False)
+    numbers = set(
+        range(max(1, current - around), min(last, current + around) + 1)
+    )
+    numbers.add(1)
+    if not estimated:
+        numbers.add(last)
+    window, previous = [], 0
+    for number in sorted(numbers):
+        if number - previous > 1:
+            window.append(None)
+        window.append(number)
+        previous = number
+    if estimated and previous < last:
+        window.append(None)
+    return window
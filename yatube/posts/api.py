@@ -0,0 +1,205 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from core.http import conditional_response
+
+from . import media, versions
+from .counters import stats_for
+from .models import Comment, Group, Post, User
+from .paginators import COMMENT_ORDERING, POSTS_PER_PAGE, CursorPaginator
+
+# Поля поста, от которых зависит ответ.
+VERSION_FIELDS = ("id", "pub_date", "revision", "comments_count")
+# Колонки для сериализации: без placeholder и счетчиков автора.
+POST_FIELDS = (
+    "author",
+    "group",
+    "text",
+    "pub_date",
+    "image",
+    "comments_count",
+    "author__username",
+    "group__slug",
+)
+COMMENT_FIELDS = ("id", "text", "created", "author__username")
+
+
+def dumps_params():
+    return {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def serialize(post):
+    return {
+        "id": post.pk,
+        "text": post.text,
+        "pub_date": post.pub_date.isoformat(),
+        "author": post.author.username,
+        "group": post.group.slug if post.group_id else None,
+        "image": (
+            media.image_storage().url(post.image.name) if post.image else None
+        ),
+        "comments_count": post.comments_count,
+    }
+
+
+def posts_by_id(ids):
+    """Посты по id одним запросом, только нужные для ответа колонки."""
+    return (
+        Post.objects.select_related("author", "group")
+        .only(*POST_FIELDS)
+        .in_bulk(ids)
+    )
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get("limit", POSTS_PER_PAGE))
+    except ValueError:
+        return POSTS_PER_PAGE
+    return min(max(size, 1), settings.POSTS_API_MAX_LIMIT)
+
+
+def feed(request, posts, **extra):
+    """Страница posts по ?cursor= с дополнительными полями extra.
+
+    По индексу ленты читаются только ключи и версии постов, по ним
+    считается ETag; тексты и связи читаются вторым запросом по id,
+    только если клиенту не хватит 304.
+    """
+    page = CursorPaginator(
+        posts.values(*VERSION_FIELDS), page_size(request)
+    ).get_page(request.GET.get("cursor"))
+    rows = list(page)
+
+    def build():
+        found = posts_by_id([row["id"] for row in rows])
+        return JsonResponse(
+            dict(
+                extra,
+                results=[
+                    serialize(found[row["id"]])
+                    for row in rows
+                    if row["id"] in found
+                ],
+                next=page.next_cursor,
+                previous=page.previous_cursor,
+            ),
+            json_dumps_params=dumps_params(),
+        )
+
+    version = [extra, rows, page.next_cursor, page.previous_cursor]
+    return conditional_response(request, version, build)
+
+
+@require_safe
+def index(request):
+    return feed(request, Post.objects.all())
+
+
+@require_safe
+def group_posts(request, slug):
+    group = get_object_or_404(
+        Group.objects.only("slug", "title", "description"), slug=slug
+    )
+    return feed(
+        request,
+        Post.objects.filter(group=group),
+        group={
+            "slug": group.slug,
+            "title": group.title,
+            "description": group.description,
+        },
+    )
+
+
+@require_safe
+def profile_posts(request, username):
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    stats = stats_for(author)
+    return feed(
+        request,
+        Post.objects.filter(author=author),
+        author={
+            "username": author.username,
+            "full_name": author.get_full_name(),
+            "posts_count": stats.posts_count,
+            "followers_count": stats.followers_count,
+            "following_count": stats.following_count,
+        },
+    )
+
+
+@require_safe
+def post_detail(request, post_id):
+    version = Post.objects.filter(pk=post_id).values(*VERSION_FIELDS).first()
+    if version is None:
+        raise Http404
+
+    def build():
+        found = posts_by_id([post_id])
+        if post_id not in found:
+            raise Http404
+        post = found[post_id]
+        comments = CursorPaginator(
+            Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+            settings.POSTS_COMMENTS_PER_PAGE,
+            ordering=COMMENT_ORDERING,
+        ).get_page(request.GET.get("cursor"))
+        return JsonResponse(
+            dict(
+                serialize(post),
+                comments=[
+                    {
+                        "id": comment["id"],
+                        "text": comment["text"],
+                        "created": comment["created"].isoformat(),
+                        "author": comment["author__username"],
+                    }
+                    for comment in comments
+                ],
+                comments_next=comments.next_cursor,
+            ),
+            json_dumps_params=dumps_params(),
+        )
+
+    cursor = request.GET.get("cursor")
+    # Имена комментаторов меняются, не трогая ни пост, ни комментарии.
+    names = versions.get(versions.NAMES)
+    return conditional_response(request, [version, cursor, names], build)
+
+
+@require_safe
+def posts_bulk(request):
+    """Посты по ?ids=1,2,3 (до POSTS_API_MAX_LIMIT): в ответе - в том же
+    порядке, несуществующие пропущены."""
+    try:
+        ids = [
+            int(post_id)
+            for post_id in request.GET.get("ids", "").split(",")
+            if post_id
+        ]
+    except ValueError:
+        return JsonResponse({"error": "ids: список чисел"}, status=400)
+    ids = list(dict.fromkeys(ids))[: settings.POSTS_API_MAX_LIMIT]
+    versions = list(
+        Post.objects.filter(pk__in=ids).order_by("pk").values(*VERSION_FIELDS)
+    )
+
+    def build():
+        found = posts_by_id(ids)
+        return JsonResponse(
+            {
+                "results": [
+                    serialize(found[post_id])
+                    for post_id in ids
+                    if post_id in found
+                ]
+            },
+            json_dumps_params=dumps_params(),
+        )
+
+    return conditional_response(request, [ids, versions], build)
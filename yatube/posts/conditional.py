@@ -0,0 +1,120 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import versions
+from .models import Comment, Follow, Group, Post, User
+from .paginators import COMMENT_ORDERING
+
+
+def page_condition(version_func):
+    """condition() для HTML-страницы: ETag из version_func(request,
+    **kwargs) - версии содержимого.
+
+    version_func считается до любых запросов самой страницы, так что на
+    совпавший If-None-Match уходит 304 без них и без рендеринга. В ETag
+    входят пользователь (от него зависят шапка и кнопки) и CSRF-токен
+    из cookie: он вшит в формы страницы и меняется при входе. Пустая
+    версия - объекта нет, ответ отдает сама view.
+
+    Last-Modified не отдается: удаление поста, переименование группы
+    или подписка меняют страницу, не сдвигая ни одну дату.
+    """
+
+    def etag(request, **kwargs):
+        version = version_func(request, **kwargs)
+        if version is None:
+            return None
+        user = [request.user.pk, request.META.get("CSRF_COOKIE")]
+        return hashlib.md5(
+            json.dumps([user, version], default=str).encode()
+        ).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Хранить можно, но перед показом - сверить ETag; чужую
+            # страницу пользователя общий кэш хранить не должен.
+            patch_cache_control(
+                response,
+                no_cache=True,
+                private=request.user.is_authenticated,
+            )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def latest(posts):
+    return posts.aggregate(latest=Max("pub_date"))["latest"]
+
+
+def group_version(request, slug):
+    group = (
+        Group.objects.filter(slug=slug)
+        .values("id", "title", "description", "posts_count")
+        .first()
+    )
+    if group is None:
+        return None
+    modified = latest(Post.objects.filter(group_id=group["id"]))
+    # Правки постов, переименования авторов и групп не двигают pub_date,
+    # их ловит версия ленты.
+    return [group, modified, versions.get(versions.FEED)]
+
+
+def profile_version(request, username):
+    author = (
+        User.objects.filter(username=username)
+        .values(
+            "id",
+            "first_name",
+            "last_name",
+            "stats__posts_count",
+            "stats__followers_count",
+            "stats__following_count",
+        )
+        .first()
+    )
+    if author is None:
+        return None
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author_id=author["id"]
+        ).exists()
+    )
+    modified = latest(Post.objects.filter(author_id=author["id"]))
+    return [author, following, modified, versions.get(versions.FEED)]
+
+
+def post_version(request, post_id):
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values(
+            "pub_date",
+            "revision",
+            "comments_count",
+            "author__stats__posts_count",
+        )
+        .first()
+    )
+    if post is None:
+        return None
+    comment = (
+        Comment.objects.filter(post_id=post_id)
+        .order_by(*COMMENT_ORDERING)
+        .values_list("created", "id")
+        .first()
+    )
+    # Переименование комментатора не трогает ни пост, ни комментарий.
+    return [post, comment, versions.get(versions.NAMES)]
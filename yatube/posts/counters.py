@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def shift(queryset, field, delta):
+    """UPDATE ... SET field = field + delta без ухода ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def bump(user_id, field, delta):
+    """Атомарно сдвигает счетчик пользователя и возвращает новое значение."""
+    if delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+    stats = UserStats.objects.filter(user_id=user_id)
+    shift(stats, field, delta)
+    return stats.values_list(field, flat=True).first() or 0
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        shift(Group.objects.filter(pk=group_id), "posts_count", delta)
+
+
+def bump_comments(post_id, delta):
+    if post_id is not None:
+        shift(Post.objects.filter(pk=post_id), "comments_count", delta)
+
+
+def revise(posts):
+    """Сбрасывает кэш карточек постов, повышая им revision."""
+    return shift(posts, "revision", 1)
+
+
+def stats_for(user):
+    """Счетчики пользователя; у кого их еще нет - нули."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def counted(queryset, field):
+    """Подзапрос COUNT(*) по field = OuterRef("pk"), 0 если строк нет."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        Value(0),
+    )
+
+
+def recount():
+    """Пересчитывает все счетчики по исходным таблицам."""
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id)
+            for user_id in User.objects.filter(stats=None).values_list(
+                "id", flat=True
+            )
+        ),
+        ignore_conflicts=True,
+    )
+    return {
+        "users": UserStats.objects.update(
+            posts_count=counted(Post.objects.all(), "author"),
+            followers_count=counted(Follow.objects.all(), "author"),
+            following_count=counted(Follow.objects.all(), "user"),
+        ),
+        "groups": Group.objects.update(
+            posts_count=counted(Post.objects.all(), "group")
+        ),
+        "posts": Post.objects.update(
+            comments_count=counted(Comment.objects.all(), "post")
+        ),
+    }
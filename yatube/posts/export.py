@@ -0,0 +1,100 @@
+import io
+import json
+import zipfile
+
+from django.utils import timezone
+
+from . import media
+
+# Строк из базы за один запрос итератора.
+ROWS_PER_FETCH = 500
+# Куски, которыми читаются картинки и отдается архив.
+CHUNK_SIZE = 64 * 1024
+
+
+class Sink(io.RawIOBase):
+    """Поток без seek, в который пишет ZipFile: записанное забирается
+    кусками, поэтому в памяти лежит не больше одного куска."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def post_rows(user):
+    posts = user.posts.select_related("group").iterator(
+        chunk_size=ROWS_PER_FETCH
+    )
+    for post in posts:
+        yield {
+            "id": post.pk,
+            "pub_date": post.pub_date.isoformat(),
+            "text": post.text,
+            "group": post.group.slug if post.group else None,
+            "image": f"images/{post.image.name}" if post.image else None,
+        }
+
+
+def comment_rows(user):
+    comments = user.comments.order_by("pk").iterator(chunk_size=ROWS_PER_FETCH)
+    for comment in comments:
+        yield {
+            "id": comment.pk,
+            "post": comment.post_id,
+            "created": comment.created.isoformat(),
+            "text": comment.text,
+        }
+
+
+def archive(user):
+    """Zip с posts.jsonl, comments.jsonl и исходными картинками постов
+    пользователя, кусками bytes по мере сборки."""
+    sink = Sink()
+    date_time = timezone.now().timetuple()[:6]
+    with zipfile.ZipFile(sink, "w") as archive:
+        for name, rows in (
+            ("posts.jsonl", post_rows(user)),
+            ("comments.jsonl", comment_rows(user)),
+        ):
+            entry = zipfile.ZipInfo(name, date_time)
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(entry, "w", force_zip64=True) as target:
+                for row in rows:
+                    line = json.dumps(row, ensure_ascii=False) + "\n"
+                    target.write(line.encode())
+                    if sink.size >= CHUNK_SIZE:
+                        yield sink.drain()
+        images = (
+            user.posts.exclude(image="")
+            .order_by("image")
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        storage = media.image_storage()
+        for image in images.iterator(chunk_size=ROWS_PER_FETCH):
+            try:
+                source = storage.open(image)
+            except OSError:
+                continue
+            # Картинки уже сжаты: храним как есть.
+            entry = zipfile.ZipInfo(f"images/{image}", date_time)
+            with source, archive.open(entry, "w", force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    target.write(chunk)
+                    yield sink.drain()
+    yield sink.drain()
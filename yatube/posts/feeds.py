@@ -0,0 +1,189 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from core.http import conditional_response
+
+from . import versions
+from .models import Group, Post, User
+
+# Меняется, когда меняется то, что видно во всех лентах (имя автора).
+ALL = "posts:syndication_version"
+
+SITE = "site"
+
+
+def group_scope(slug):
+    return f"group:{slug}"
+
+
+def author_scope(username):
+    return f"author:{username}"
+
+
+def version_key(scope):
+    # Слаги и имена бывают не ASCII и длинными - в ключ идет их хэш.
+    digest = hashlib.md5(scope.encode()).hexdigest()
+    return f"posts:syndication_version:{digest}"
+
+
+def bump(*scopes):
+    """Сбрасывает кэш лент scopes."""
+    for scope in scopes:
+        versions.bump(version_key(scope))
+
+
+def bump_post(post, old_group_id=None):
+    """Сбрасывает ленты сайта, автора и групп поста (старой и новой)."""
+    group_ids = {post.group_id, old_group_id} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        "slug", flat=True
+    )
+    bump(
+        SITE,
+        author_scope(post.author.username),
+        *(group_scope(slug) for slug in slugs),
+    )
+
+
+class PostsFeed(Feed):
+    """RSS последних постов; кэшируется целиком по версии своей ленты.
+
+    Пока версия не изменилась, запрос стоит пары обращений к кэшу без
+    базы, а клиент с тем же ETag получает 304.
+    """
+
+    def scope(self, **kwargs):
+        return SITE
+
+    def __call__(self, request, *args, **kwargs):
+        scope = self.scope(**kwargs)
+        version = [
+            type(self).__name__,
+            request.get_host(),
+            versions.get(ALL),
+            versions.get(version_key(scope)),
+            scope,
+        ]
+        key = (
+            "posts:syndication:"
+            + hashlib.md5(str(version).encode()).hexdigest()
+        )
+
+        def build():
+            cached = cache.get(key)
+            if cached is None:
+                response = super(PostsFeed, self).__call__(
+                    request, *args, **kwargs
+                )
+                cached = (
+                    response.content,
+                    response["Content-Type"],
+                    response.get("Last-Modified"),
+                )
+                cache.set(key, cached, settings.POSTS_FEED_CACHE_TIMEOUT)
+            content, content_type, last_modified = cached
+            response = HttpResponse(content, content_type=content_type)
+            if last_modified:
+                response["Last-Modified"] = last_modified
+            return response
+
+        return conditional_response(request, version, build)
+
+    def title(self, obj):
+        return "Yatube: последние записи"
+
+    def link(self, obj):
+        return reverse("posts:index")
+
+    def description(self, obj):
+        return "Последние записи на Yatube"
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        return self.posts(obj).select_related("author", "group")[
+            : settings.POSTS_FEED_ITEMS
+        ]
+
+    def item_title(self, item):
+        first_line = item.text.strip().split("\n", 1)[0]
+        return Truncator(first_line).chars(80)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse("posts:post_detail", args=[item.pk])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class GroupPostsFeed(PostsFeed):
+    def scope(self, slug):
+        return group_scope(slug)
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f"Yatube: {obj.title}"
+
+    def link(self, obj):
+        return reverse("posts:group_list", args=[obj.slug])
+
+    def description(self, obj):
+        return obj.description
+
+    def posts(self, obj):
+        return Post.objects.filter(group=obj)
+
+
+class AuthorPostsFeed(PostsFeed):
+    def scope(self, username):
+        return author_scope(username)
+
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f"Yatube: {obj.get_full_name() or obj.username}"
+
+    def link(self, obj):
+        return reverse("posts:profile", args=[obj.username])
+
+    def description(self, obj):
+        return f"Записи пользователя {obj.username}"
+
+    def posts(self, obj):
+        return Post.objects.filter(author=obj)
+
+
+class AtomPostsFeed(PostsFeed):
+    feed_type = Atom1Feed
+    subtitle = PostsFeed.description
+
+
+class AtomGroupPostsFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = GroupPostsFeed.description
+
+
+class AtomAuthorPostsFeed(AuthorPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = AuthorPostsFeed.description
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import ingest
 from .models import Post, Comment
 
 
@@ -10,6 +12,12 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError("Пост не может быть пустым!")
         return data
 
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+        if isinstance(image, UploadedFile):
+            return ingest(image)
+        return image
+
     class Meta:
         model = Post
         fields = ("text", "group", "image")
@@ -0,0 +1,124 @@
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+ALLOWED_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+# Ключи Image.info, которые не нужны для показа картинки.
+METADATA = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+# Размер заглушки - пропорции миниатюры 960x339 в ленте.
+PLACEHOLDER_SIZE = (24, 9)
+
+
+def has_alpha(image):
+    if image.mode == "P" and "transparency" in image.info:
+        image = image.convert("RGBA")
+    if image.mode not in ("RGBA", "LA"):
+        return False
+    return image.getchannel("A").getextrema()[0] < 255
+
+
+def open_header(upload):
+    """Открывает картинку, прочитав только заголовок, и проверяет его."""
+    if upload.size > settings.POSTS_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            "Файл больше %(limit)s МБ.",
+            code="too_large",
+            params={"limit": settings.POSTS_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError("Слишком большая картинка.", code="too_big")
+    except (OSError, SyntaxError):
+        raise ValidationError("Не удалось прочитать картинку.", code="bad")
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            "Поддерживаются только JPEG, PNG, GIF и WebP.", code="format"
+        )
+    width, height = image.size
+    if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+        raise ValidationError("Слишком большая картинка.", code="too_big")
+    return image
+
+
+def encode(image):
+    """Кодирует картинку без метаданных: (байты, расширение, MIME)."""
+    for key in METADATA:
+        image.info.pop(key, None)
+    output = BytesIO()
+    options = {}
+    if image.info.get("icc_profile"):
+        options["icc_profile"] = image.info["icc_profile"]
+    if has_alpha(image):
+        image.convert("RGBA").save(output, "PNG", optimize=True, **options)
+        return output.getvalue(), "png", "image/png"
+    image.convert("RGB").save(
+        output,
+        "JPEG",
+        quality=settings.POSTS_IMAGE_QUALITY,
+        optimize=True,
+        progressive=True,
+        **options,
+    )
+    return output.getvalue(), "jpg", "image/jpeg"
+
+
+def ingest(upload):
+    """Проверяет и нормализует загруженную картинку поста.
+
+    Формат и размеры проверяются по заголовку, до декодирования.
+    Картинка уменьшается до POSTS_IMAGE_MAX_EDGE по длинной стороне
+    (JPEG декодируется сразу в уменьшенном масштабе), поворачивается по
+    EXIF и перекодируется без метаданных. Исходный файл остается, если
+    его нечего уменьшать и чистить, а новый не получился меньше.
+    """
+    image = open_header(upload)
+    edge = settings.POSTS_IMAGE_MAX_EDGE
+    if getattr(image, "is_animated", False):
+        if max(image.size) > edge:
+            raise ValidationError(
+                "Анимация больше %(edge)s px.",
+                code="too_big",
+                params={"edge": edge},
+            )
+        upload.seek(0)
+        return upload
+    resized = max(image.size) > edge
+    stripped = any(key in image.info for key in METADATA)
+    try:
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        image = ImageOps.exif_transpose(image)
+        data, extension, content_type = encode(image)
+    except (OSError, SyntaxError, ValueError):
+        raise ValidationError("Не удалось прочитать картинку.", code="bad")
+    if not resized and not stripped and len(data) >= upload.size:
+        upload.seek(0)
+        return upload
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f"{stem}.{extension}", data, content_type=content_type
+    )
+
+
+def placeholder(file):
+    """Крошечная копия картинки как data: URI в несколько сотен байт:
+    ее показывают растянутой, пока грузится сама картинка."""
+    image = Image.open(file)
+    # JPEG декодируется сразу в масштабе 1/8.
+    image.draft("RGB", (PLACEHOLDER_SIZE[0] * 4, PLACEHOLDER_SIZE[1] * 4))
+    image = ImageOps.fit(
+        ImageOps.exif_transpose(image).convert("RGB"),
+        PLACEHOLDER_SIZE,
+        Image.BOX,
+    )
+    output = BytesIO()
+    image.save(output, "JPEG", quality=40, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(
+        output.getvalue()
+    ).decode()
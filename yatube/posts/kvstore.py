@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class KVStore(CachedDBStore):
+    """cached_db-хранилище sorl-thumbnail с пакетным чтением.
+
+    prefetch() поднимает ключи сразу многих картинок одним get_many
+    кэша и одним запросом к базе по промахам; внутри его контекста
+    обычные чтения тега {% thumbnail %} обслуживаются из памяти.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+
+    def get_many_raw(self, keys):
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing).values_list(
+                    "key", "value"
+                )
+            )
+            # Как и _get_raw, кэшируем и отсутствие ключа.
+            fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(fetched, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return values
+
+    @contextmanager
+    def prefetch(self, image_files):
+        keys = list({add_prefix(image_file.key) for image_file in image_files})
+        self.local.values = self.get_many_raw(keys) if keys else {}
+        try:
+            yield
+        finally:
+            self.local.values = {}
+
+    def forget(self, image_file):
+        """Удаляет ключи картинки и ее миниатюр, не трогая сами файлы."""
+        for key in self._get(image_file.key, identity="thumbnails") or []:
+            self._delete(key)
+        self._delete(image_file.key, identity="thumbnails")
+        self._delete(image_file.key)
+
+    def _get_raw(self, key):
+        values = getattr(self.local, "values", {})
+        if key not in values:
+            return super()._get_raw(key)
+        if values[key] == EMPTY_VALUE:
+            return None
+        return values[key]
+
+    def _set_raw(self, key, value):
+        getattr(self.local, "values", {}).pop(key, None)
+        super()._set_raw(key, value)
@@ -0,0 +1,138 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from posts.models import Follow, Post
+from posts.paginators import POSTS_PER_PAGE
+from posts.timeline import MergeSource
+
+User = get_user_model()
+
+SCALES = (10, 1000, 10000)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает ленту подписок через подзапрос author_id__in "
+        "с k-way слиянием потоков авторов. Данные создаются во "
+        "временной транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            nargs="+",
+            type=int,
+            default=SCALES,
+            help="Сколько авторов в подписках читателя.",
+        )
+        parser.add_argument(
+            "--posts",
+            type=int,
+            default=5,
+            help="Сколько постов у каждого автора.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        scales = sorted(options["scales"])
+        User.objects.bulk_create(
+            User(username=f"bench_author_{i}", password="!")
+            for i in range(scales[-1])
+        )
+        authors = list(
+            User.objects.filter(
+                username__startswith="bench_author_"
+            ).order_by("id")
+        )
+        self.create_posts(authors, options["posts"])
+
+        self.stdout.write(
+            f"{'followees':>10} {'engine':>10} {'median, ms':>12} "
+            f"{'queries':>8}"
+        )
+        for scale in scales:
+            reader = User.objects.create(
+                username=f"bench_reader_{scale}", password="!"
+            )
+            Follow.objects.bulk_create(
+                Follow(user=reader, author=author)
+                for author in authors[:scale]
+            )
+            engines = {
+                "subquery": lambda: self.subquery_page(reader),
+                "merge": lambda: MergeSource(reader.id).fetch(
+                    None, False, POSTS_PER_PAGE
+                ),
+            }
+            expected = None
+            for name, engine in engines.items():
+                timings, queries, page = self.measure(
+                    engine, options["repeat"]
+                )
+                ids = [post.id for post in page]
+                if expected is None:
+                    expected = ids
+                elif ids != expected:
+                    self.stderr.write(f"{name}: страница не совпала!")
+                self.stdout.write(
+                    f"{scale:>10} {name:>10} "
+                    f"{statistics.median(timings) * 1000:>12.2f} "
+                    f"{queries:>8}"
+                )
+
+    def create_posts(self, authors, per_author):
+        """Посты со случайными датами за последний год."""
+        now = timezone.now()
+        posts = [
+            Post(
+                author=author,
+                text="bench",
+                pub_date=now - timedelta(seconds=random.randrange(31536000)),
+            )
+            for author in authors
+            for _ in range(per_author)
+        ]
+        pub_date = Post._meta.get_field("pub_date")
+        pub_date.auto_now_add = False
+        try:
+            Post.objects.bulk_create(posts)
+        finally:
+            pub_date.auto_now_add = True
+
+    def subquery_page(self, reader):
+        """Прежняя реализация follow_index: подзапрос по Follow."""
+        authors = Follow.objects.filter(user=reader).values_list("author")
+        return list(
+            Post.objects.select_related("author", "group").filter(
+                author_id__in=authors
+            )[:POSTS_PER_PAGE]
+        )
+
+    def measure(self, engine, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                page = engine()
+                timings.append(time.perf_counter() - started)
+        return timings, len(context.captured_queries), page
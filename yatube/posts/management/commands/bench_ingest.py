@@ -0,0 +1,114 @@
+import os
+import statistics
+import time
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from posts.images import ingest
+
+# Синтетический корпус, если свои картинки не переданы:
+# (имя, размер, формат, с EXIF).
+CORPUS = (
+    ("phone.jpg", (4032, 3024), "JPEG", True),
+    ("camera.jpg", (6000, 4000), "JPEG", True),
+    ("screenshot.png", (2560, 1440), "PNG", False),
+    ("avatar.jpg", (800, 600), "JPEG", False),
+)
+
+
+def synthetic(size, image_format, with_exif):
+    """Картинка, похожая на фото: градиент с шумом."""
+    noise = Image.effect_noise(size, 48).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    image = Image.blend(noise, gradient, 0.6)
+    output = BytesIO()
+    options = {}
+    if with_exif:
+        exif = Image.Exif()
+        exif[0x010F] = "Phone"
+        exif[0x0112] = 6
+        options["exif"] = exif.tobytes()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def decode_time(data, repeat):
+    """Медиана времени полного декодирования, как в sorl-thumbnail."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        Image.open(BytesIO(data)).load()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет загрузку картинок постов: время обработки, размер "
+        "файла и время декодирования до и после."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Картинки или каталоги с ними (по умолчанию - "
+            "синтетический корпус).",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def corpus(self, paths):
+        if not paths:
+            for name, size, image_format, with_exif in CORPUS:
+                yield name, synthetic(size, image_format, with_exif)
+            return
+        for path in paths:
+            if os.path.isdir(path):
+                names = sorted(os.listdir(path))
+                files = [os.path.join(path, name) for name in names]
+            elif os.path.isfile(path):
+                files = [path]
+            else:
+                raise CommandError(f"Нет такого файла: {path}")
+            for file_path in files:
+                with open(file_path, "rb") as source:
+                    yield os.path.basename(file_path), source.read()
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        self.stdout.write(
+            f"{'image':>16} {'KB before':>10} {'KB after':>9} "
+            f"{'ingest, ms':>11} {'decode before':>14} {'decode after':>13}"
+        )
+        before_total = after_total = 0
+        for name, data in self.corpus(options["paths"]):
+            timings = []
+            for _ in range(repeat):
+                upload = SimpleUploadedFile(name, data)
+                started = time.perf_counter()
+                try:
+                    result = ingest(upload)
+                except Exception as error:
+                    self.stdout.write(f"{name:>16} отклонена: {error}")
+                    break
+                timings.append(time.perf_counter() - started)
+            else:
+                result.seek(0)
+                processed = result.read()
+                before_total += len(data)
+                after_total += len(processed)
+                self.stdout.write(
+                    f"{name:>16} {len(data) / 1024:>10.0f} "
+                    f"{len(processed) / 1024:>9.0f} "
+                    f"{statistics.median(timings) * 1000:>11.1f} "
+                    f"{decode_time(data, repeat) * 1000:>14.1f} "
+                    f"{decode_time(processed, repeat) * 1000:>13.1f}"
+                )
+        if before_total:
+            self.stdout.write(
+                f"Итого: {before_total / 1024:.0f} KB -> "
+                f"{after_total / 1024:.0f} KB"
+            )
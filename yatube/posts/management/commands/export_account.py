@@ -0,0 +1,46 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Пишет zip-архив постов, комментариев и картинок пользователя "
+        "(как /export/) в файл или stdout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument(
+            "-o",
+            "--output",
+            default="-",
+            help="Файл архива; - писать в stdout.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"Нет пользователя {options['username']}")
+        if options["output"] == "-":
+            self.write(user, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+            return
+        with open(options["output"], "wb") as target:
+            size = self.write(user, target)
+        self.stdout.write(
+            self.style.SUCCESS(f"{options['output']}: {size / 2 ** 20:.1f} МБ")
+        )
+
+    def write(self, user, target):
+        size = 0
+        for chunk in export.archive(user):
+            target.write(chunk)
+            size += len(chunk)
+        return size
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import media, resize, thumbnails
+from posts.models import Post, ThumbnailTask
+
+
+def fingerprint(name):
+    """8 байт хэша вместо строки имени, чтобы множество ссылок занимало
+    мало памяти. Совпадение хэшей только оставит лишний файл на диске."""
+    name = name.replace(os.sep, "/")
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def scan(path):
+    """Файлы под path по одному, не читая каталоги в списки.
+
+    Скрытые каталоги (блокировки resize) пропускаются.
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith("."):
+                    yield from scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет из MEDIA_ROOT картинки, миниатюры и варианты, на которые "
+        "не ссылается ни один пост, и их ключи в kvstore sorl-thumbnail."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать файлы-сироты.",
+        )
+        parser.add_argument(
+            "--quarantine",
+            default=None,
+            help="Переносить сирот в этот каталог вместо удаления.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=settings.POSTS_MEDIA_MIN_AGE,
+            help="Не трогать файлы моложе стольких секунд: пост с "
+            "только что загруженной картинкой мог еще не сохраниться "
+            "(по умолчанию - POSTS_MEDIA_MIN_AGE).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def directories(self):
+        """Каталоги MEDIA_ROOT, которыми распоряжается posts."""
+        return {
+            "image": Post._meta.get_field("image").upload_to.strip("/"),
+            "thumbnail": thumbnail_settings.THUMBNAIL_PREFIX.strip("/"),
+            "variant": "resized",
+        }
+
+    def references(self, batch_size):
+        """Отпечатки всех файлов, на которые ссылаются посты: картинок,
+        их миниатюр POSTS_THUMBNAILS и вариантов POSTS_RESIZE_SIZES."""
+        backend = thumbnails.DeferredThumbnailBackend()
+        sizes = [
+            tuple(int(side) for side in size.split("x"))
+            for size in settings.POSTS_RESIZE_SIZES
+        ]
+        posts = Post.objects.exclude(image="").order_by("pk")
+        found = set()
+        after = 0
+        while True:
+            rows = list(
+                posts.filter(pk__gt=after).values_list("pk", "image")[
+                    :batch_size
+                ]
+            )
+            if not rows:
+                return found
+            after = rows[-1][0]
+            for name in dict.fromkeys(image for _, image in rows):
+                found.add(fingerprint(name))
+                source = media.image_file(name)
+                for geometry, options in settings.POSTS_THUMBNAILS:
+                    thumbnail = backend.thumbnail_file(
+                        source, geometry, options
+                    )
+                    found.add(fingerprint(thumbnail.name))
+                for width, height in sizes:
+                    if resize.allowed(name, width, height):
+                        variant = resize.Variant(name, width, height)
+                        found.add(fingerprint(variant.cache_name))
+
+    def purge(self, kind, name):
+        """Ключи kvstore и задачи очереди удаляемого файла."""
+        if kind == "image":
+            default.kvstore.forget(media.image_file(name))
+            ThumbnailTask.objects.filter(image=name).delete()
+        elif kind == "thumbnail":
+            default.kvstore.forget(ImageFile(name, default.storage))
+
+    def remove(self, path, name, quarantine):
+        if quarantine is None:
+            os.remove(path)
+            return
+        target = os.path.join(quarantine, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+
+    def check_quarantine(self, quarantine, directories):
+        quarantine = os.path.abspath(quarantine)
+        for directory in directories.values():
+            root = os.path.abspath(
+                os.path.join(settings.MEDIA_ROOT, directory)
+            )
+            if os.path.commonpath([root, quarantine]) == root:
+                raise CommandError(f"Карантин не может лежать внутри {root}")
+        return quarantine
+
+    def orphans(self, directories, referenced, deadline):
+        """(вид, файл, имя) файлов без ссылок старше deadline."""
+        for kind, directory in directories.items():
+            root = os.path.join(settings.MEDIA_ROOT, directory)
+            if not os.path.isdir(root):
+                continue
+            for entry in scan(root):
+                # Недописанные временные файлы - тоже мусор, остальные
+                # скрытые файлы (контрольные точки) не трогаем.
+                hidden = entry.name.startswith(".")
+                if hidden and not entry.name.endswith(".tmp"):
+                    continue
+                name = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                name = name.replace(os.sep, "/")
+                if entry.stat(follow_symlinks=False).st_mtime > deadline:
+                    continue
+                if fingerprint(name) in referenced:
+                    continue
+                # Ту же картинку могли загрузить снова после подсчета.
+                if kind == "image" and (
+                    Post.objects.filter(image=name).exists()
+                ):
+                    continue
+                yield kind, entry, name
+
+    def handle(self, *args, **options):
+        quarantine = options["quarantine"]
+        directories = self.directories()
+        if quarantine is not None:
+            quarantine = self.check_quarantine(quarantine, directories)
+        referenced = self.references(options["batch_size"])
+        self.stdout.write(f"Файлов с ссылками: {len(referenced)}")
+        deadline = time.time() - options["min_age"]
+        orphans = size = 0
+        for kind, entry, name in self.orphans(
+            directories, referenced, deadline
+        ):
+            orphans += 1
+            size += entry.stat(follow_symlinks=False).st_size
+            if options["dry_run"]:
+                self.stdout.write(name)
+                continue
+            self.purge(kind, name)
+            self.remove(entry.path, name, quarantine)
+        summary = f"Сирот: {orphans}, {size / 2 ** 20:.1f} МБ"
+        if options["dry_run"]:
+            summary += " (пробный прогон, ничего не удалено)"
+        elif quarantine is not None:
+            summary += f", перенесены в {quarantine}"
+        self.stdout.write(self.style.SUCCESS(summary))
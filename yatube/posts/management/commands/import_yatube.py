@@ -0,0 +1,342 @@
+import json
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.db.models import Max, Q
+from django.db.models.sql import InsertQuery
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import counters, search, timeline, versions
+from posts.models import Comment, Follow, Group, Post, User
+
+# Порядок записи пачки: сначала то, на что ссылаются остальные.
+MODELS = ("user", "group", "post", "comment", "follow")
+# Сколько ключей искать одним запросом (SQLite - до 999 параметров).
+LOOKUP_CHUNK = 500
+
+
+def insert(model, objs):
+    """INSERT пачкой, как bulk_create, но без pre_save полей: даты
+    auto_now_add берутся из входных данных, как у loaddata (raw)."""
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if objs[0].pk is not None or not isinstance(field, models.AutoField)
+    ]
+    batch_size = connection.ops.bulk_batch_size(fields, objs)
+    for start in range(0, len(objs), batch_size):
+        end = start + batch_size
+        batch = objs[start:end]
+        query = InsertQuery(model)
+        query.insert_values(fields, batch, raw=True)
+        query.get_compiler(connection=connection).execute_sql()
+
+
+def next_id(model):
+    """Первый свободный id. На SQLite учитывается и счетчик
+    AUTOINCREMENT, чтобы не вернулись id удаленных постов: по
+    (id, revision) кэшируются карточки."""
+    top = model.objects.aggregate(top=Max("pk"))["top"] or 0
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = %s",
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row:
+            top = max(top, row[0])
+    return top + 1
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f"не дата: {value}")
+    if settings.USE_TZ and timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает пользователей, группы, посты, комментарии и подписки "
+        'из JSONL, по объекту в строке: {"model": "user", '
+        '"username": ...}, {"model": "group", "slug": ..., '
+        '"title": ...}, {"model": "post", "id": внешний id, '
+        '"author": username, "group": slug, "text": ..., '
+        '"pub_date": ISO 8601, "image": имя в хранилище}, '
+        '{"model": "comment", "post": внешний id поста, '
+        '"author": username, "text": ..., "created": ...}, '
+        '{"model": "follow", "user": username, "author": username}. '
+        "Счетчики, поисковый индекс, ленты и картинки пересобираются "
+        "один раз в конце. Не запускайте вместе с публикацией постов: "
+        "id новых постов выдаются заранее."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="+", help="Файлы JSONL; - читать stdin."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Строк в одной транзакции.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Процессов для reprocess_media в конце.",
+        )
+        parser.add_argument(
+            "--skip-media",
+            action="store_true",
+            help="Не запускать reprocess_media для картинок.",
+        )
+
+    def lines(self, paths):
+        for path in paths:
+            if path == "-":
+                yield from enumerate(sys.stdin, 1)
+                continue
+            try:
+                with open(path, encoding="utf-8") as source:
+                    yield from enumerate(source, 1)
+            except OSError as error:
+                raise CommandError(f"{path}: {error}")
+
+    def lookup(self, known, queryset, field, keys):
+        """Дополняет known (ключ -> id) строками queryset с field из keys,
+        которых в known еще нет."""
+        missing = list(
+            {key for key in keys if isinstance(key, str) and key not in known}
+        )
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            end = start + LOOKUP_CHUNK
+            chunk = missing[start:end]
+            known.update(
+                queryset.filter(**{f"{field}__in": chunk}).values_list(
+                    field, "pk"
+                )
+            )
+
+    def resolve(self, rows, build):
+        """Объекты из (строка, запись) через build; записи с ошибками
+        пропускаются с сообщением."""
+        objs = []
+        for lineno, record in rows:
+            try:
+                objs.append(build(record))
+            except (KeyError, TypeError, ValueError) as error:
+                self.skipped[record.get("model")] += 1
+                self.stderr.write(f"Строка {lineno}: {error!r}, пропущена")
+        return objs
+
+    def build_user(self, record):
+        return User(
+            username=record["username"],
+            first_name=record.get("first_name", ""),
+            last_name=record.get("last_name", ""),
+            email=record.get("email", ""),
+            password=record.get("password") or make_password(None),
+        )
+
+    def build_group(self, record):
+        return Group(
+            slug=record["slug"],
+            title=record["title"],
+            description=record.get("description", ""),
+        )
+
+    def build_post(self, record):
+        post = Post(
+            pk=self.post_id,
+            author_id=self.users[record["author"]],
+            group_id=(
+                self.groups[record["group"]] if record.get("group") else None
+            ),
+            text=record["text"],
+            pub_date=parse_date(record.get("pub_date")),
+            image=record.get("image") or "",
+        )
+        self.post_id += 1
+        if "id" in record:
+            self.posts[record["id"]] = post.pk
+        return post
+
+    def build_comment(self, record):
+        return Comment(
+            post_id=self.posts[record["post"]],
+            author_id=self.users[record["author"]],
+            text=record["text"],
+            created=parse_date(record.get("created")),
+        )
+
+    def build_follow(self, record):
+        user_id = self.users[record["user"]]
+        author_id = self.users[record["author"]]
+        if user_id == author_id:
+            raise ValueError("подписка на себя")
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def flush(self, buffers):
+        with transaction.atomic():
+            for model in MODELS:
+                rows = buffers.pop(model, [])
+                if not rows:
+                    continue
+                records = [record for _, record in rows]
+                if model in ("user", "post", "comment", "follow"):
+                    self.lookup(
+                        self.users,
+                        User.objects.all(),
+                        "username",
+                        [
+                            record.get(key)
+                            for record in records
+                            for key in ("username", "author", "user")
+                        ],
+                    )
+                if model in ("group", "post"):
+                    self.lookup(
+                        self.groups,
+                        Group.objects.all(),
+                        "slug",
+                        [
+                            record.get(key)
+                            for record in records
+                            for key in ("slug", "group")
+                        ],
+                    )
+                self.write(model, rows)
+
+    def write(self, model, rows):
+        objs = self.resolve(rows, getattr(self, f"build_{model}"))
+        if not objs:
+            return
+        if model == "user":
+            objs = [user for user in objs if user.username not in self.users]
+            User.objects.bulk_create(objs, ignore_conflicts=True)
+            self.lookup(
+                self.users,
+                User.objects.all(),
+                "username",
+                [user.username for user in objs],
+            )
+        elif model == "group":
+            objs = [group for group in objs if group.slug not in self.groups]
+            Group.objects.bulk_create(objs, ignore_conflicts=True)
+            self.lookup(
+                self.groups,
+                Group.objects.all(),
+                "slug",
+                [group.slug for group in objs],
+            )
+        elif model == "follow":
+            Follow.objects.bulk_create(objs, ignore_conflicts=True)
+        else:
+            insert(type(objs[0]), objs)
+        self.imported[model] += len(objs)
+
+    def read(self, paths, batch_size):
+        """Читает записи и пишет их пачками по batch_size строк."""
+        buffers = {}
+        buffered = rows = 0
+        started = time.perf_counter()
+        for lineno, line in self.lines(paths):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                model = record["model"]
+                if model not in MODELS:
+                    raise ValueError(f"неизвестная модель {model}")
+            except (ValueError, KeyError, TypeError) as error:
+                self.skipped["?"] += 1
+                self.stderr.write(f"Строка {lineno}: {error!r}, пропущена")
+                continue
+            buffers.setdefault(model, []).append((lineno, record))
+            buffered += 1
+            if buffered >= batch_size:
+                self.flush(buffers)
+                rows += buffered
+                buffered = 0
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"Строк {rows}, {rows / elapsed:.0f} строк/с"
+                )
+        self.flush(buffers)
+        return rows + buffered, time.perf_counter() - started
+
+    def rebuild(self, first_post_id, first_follow_id):
+        """Производные данные, которые при загрузке не обновлялись."""
+        new_posts = Post.objects.filter(pk__gte=first_post_id)
+        with transaction.atomic():
+            counters.recount()
+            search.reindex(new_posts)
+        versions.bump(versions.COUNTS)
+        versions.bump(versions.FEED)
+        followers = (
+            Follow.objects.filter(
+                Q(author__posts__pk__gte=first_post_id)
+                | Q(pk__gte=first_follow_id)
+            )
+            .order_by("user_id")
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+        feeds = 0
+        for user_id in followers.iterator():
+            timeline.rebuild(user_id)
+            feeds += 1
+        self.stdout.write(f"Счетчики и поиск обновлены, лент: {feeds}")
+        return new_posts.exclude(image="").exists()
+
+    def handle(self, *args, **options):
+        self.users = {}
+        self.groups = {}
+        self.posts = {}
+        self.imported = Counter()
+        self.skipped = Counter()
+        first_post_id = self.post_id = next_id(Post)
+        first_follow_id = next_id(Follow)
+        rows, elapsed = self.read(options["paths"], options["batch_size"])
+        for model in MODELS:
+            self.stdout.write(
+                f"{model}: {self.imported[model]}, "
+                f"пропущено {self.skipped[model]}"
+            )
+        self.stdout.write(
+            f"Строк {rows} за {elapsed:.1f} с, "
+            f"{rows / max(elapsed, 1e-9):.0f} строк/с"
+        )
+        with_images = self.rebuild(first_post_id, first_follow_id)
+        if with_images and not options["skip_media"]:
+            workers = {}
+            if options["workers"] is not None:
+                workers["workers"] = options["workers"]
+            # Только загруженные посты и с чистой контрольной точкой.
+            call_command(
+                "reprocess_media",
+                start_after=first_post_id - 1,
+                stdout=self.stdout,
+                stderr=self.stderr,
+                **workers,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Загружено {sum(self.imported.values())}, "
+                f"пропущено {sum(self.skipped.values())}"
+            )
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает полнотекстовый индекс постов (posts_post_search) "
+        "по таблицам постов, авторов и групп."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Постов в поисковом индексе: {count}")
+        )
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Пересобирает ленты подписок (FeedEntry) по таблице Follow."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Пользователи, чьи ленты пересобрать (по умолчанию все).",
+        )
+        parser.add_argument(
+            "--trim",
+            action="store_true",
+            help="Только обрезать ленты до FEED_TIMELINE_LENGTH.",
+        )
+
+    def handle(self, *args, **options):
+        if options["usernames"]:
+            users = User.objects.filter(username__in=options["usernames"])
+            missing = set(options["usernames"]) - set(
+                users.values_list("username", flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    f"Нет таких пользователей: {', '.join(sorted(missing))}"
+                )
+            user_ids = users.values_list("id", flat=True)
+        else:
+            user_ids = (
+                Follow.objects.order_by("user_id")
+                .values_list("user_id", flat=True)
+                .distinct()
+            )
+        count = 0
+        for user_id in user_ids.iterator():
+            if options["trim"]:
+                timeline.trim([user_id])
+            else:
+                timeline.rebuild(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Обработано лент: {count}"))
@@ -0,0 +1,190 @@
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import media, resize, thumbnails, versions
+from posts.models import Post
+
+# Сколько секунд ждать, пока загрузка не опустится ниже --max-load.
+PAUSE = 5
+
+
+def reprocess(image):
+    """(картинка, новых вариантов, ошибки) - выполняется в воркере."""
+    created = 0
+    errors = []
+    steps = (media.fill_placeholders, thumbnails.generate, resize.generate)
+    for generate in steps:
+        try:
+            created += generate(image)
+        except Exception as error:
+            errors.append(repr(error))
+    return image, created, "; ".join(errors)
+
+
+def load_average():
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        # Платформа не сообщает загрузку: не притормаживаем.
+        return 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует заглушки, миниатюры POSTS_THUMBNAILS и варианты "
+        "POSTS_RESIZE_SIZES для всех картинок постов в пуле процессов. "
+        "Прерванный проход продолжается с контрольной точки, картинки "
+        "с ошибками повторяются при следующем запуске."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Процессов в пуле (по умолчанию - число ядер); "
+            "0 - в текущем процессе.",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--max-load",
+            type=float,
+            default=None,
+            help="Ждать перед пачкой, пока средняя загрузка за минуту "
+            "выше (по умолчанию - POSTS_REPROCESS_MAX_LOAD).",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="Файл контрольной точки (по умолчанию - "
+            "MEDIA_ROOT/.reprocess_media.json).",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Начать сначала, не глядя на контрольную точку.",
+        )
+        parser.add_argument(
+            "--start-after",
+            type=int,
+            default=None,
+            help="Обработать только посты с id больше этого, не глядя "
+            "на контрольную точку (import_yatube - новые посты).",
+        )
+
+    def batches(self, after, size):
+        """(последний pk, картинки без повторов) пачками по pk."""
+        posts = Post.objects.exclude(image="").order_by("pk")
+        while True:
+            rows = list(
+                posts.filter(pk__gt=after).values_list("pk", "image")[:size]
+            )
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield after, list(dict.fromkeys(image for _, image in rows))
+
+    def read_checkpoint(self, path):
+        """(последний pk, картинки с ошибками) прошлого прохода."""
+        try:
+            with open(path) as checkpoint:
+                state = json.load(checkpoint)
+            return state["after"], list(state.get("failed", []))
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0, []
+
+    def write_checkpoint(self, path, after, failed):
+        temporary = path + ".tmp"
+        with open(temporary, "w") as checkpoint:
+            json.dump({"after": after, "failed": failed}, checkpoint)
+        os.replace(temporary, path)
+
+    def resume(self, path, options):
+        """(последний pk, пачки) с контрольной точки: сначала картинки,
+        на которых прошлый проход споткнулся, затем посты после него."""
+        after, retry = 0, []
+        if options["start_after"] is not None:
+            after = options["start_after"]
+        elif not options["restart"]:
+            after, retry = self.read_checkpoint(path)
+        if after:
+            self.stdout.write(f"Продолжаем после поста {after}")
+        batches = self.batches(after, options["batch_size"])
+        if retry:
+            self.stdout.write(f"Повторяем картинки с ошибками: {len(retry)}")
+            batches = itertools.chain([(after, retry)], batches)
+        return after, batches
+
+    def finish(self, path, after, failed):
+        """Контрольная точка удаляется, только если ошибок не было."""
+        if failed:
+            self.write_checkpoint(path, after, failed)
+            self.stdout.write(f"Картинки с ошибками сохранены в {path}")
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def throttle(self, max_load):
+        while max_load and load_average() > max_load:
+            self.stdout.write(
+                f"Загрузка {load_average():.1f} выше {max_load}, пауза"
+            )
+            time.sleep(PAUSE)
+
+    def handle(self, *args, **options):
+        path = options["checkpoint"] or os.path.join(
+            settings.MEDIA_ROOT, ".reprocess_media.json"
+        )
+        max_load = options["max_load"]
+        if max_load is None:
+            max_load = settings.POSTS_REPROCESS_MAX_LOAD
+        after, batches = self.resume(path, options)
+        executor = None
+        run = map
+        if options["workers"]:
+            # spawn, а не fork: дочерние процессы не наследуют открытые
+            # соединения с базой.
+            executor = ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+            run = executor.map
+        started = time.perf_counter()
+        images = created = 0
+        failed = []
+        try:
+            for after, batch in batches:
+                self.throttle(max_load)
+                for image, count, error in run(reprocess, batch):
+                    created += count
+                    if error:
+                        if image not in failed:
+                            failed.append(image)
+                        self.stderr.write(f"{image}: {error}")
+                images += len(batch)
+                self.write_checkpoint(path, after, failed)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"До поста {after}: картинок {images}, новых вариантов "
+                    f"{created}, {images / elapsed:.1f} картинок/с"
+                )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if created:
+                versions.bump(versions.FEED)
+        self.finish(path, after, failed)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: картинок {images}, новых вариантов {created}, "
+                f"с ошибками {len(failed)}"
+            )
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает очередь генерации миниатюр; с --run разбирает ее "
+        "в текущем процессе."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--run",
+            action="store_true",
+            help="Сгенерировать все миниатюры из очереди.",
+        )
+
+    def handle(self, *args, **options):
+        if options["run"]:
+            released = thumbnails.release_stale()
+            if released:
+                self.stdout.write(f"Возвращено в очередь: {released}")
+            done = thumbnails.process()
+            self.stdout.write(self.style.SUCCESS(f"Готово миниатюр: {done}"))
+        queue = thumbnails.pending()
+        self.stdout.write(f"В очереди: {queue.filter(started=None).count()}")
+        self.stdout.write(f"В работе: {queue.exclude(started=None).count()}")
+        self.stdout.write(f"С ошибками: {thumbnails.failed().count()}")
@@ -0,0 +1,76 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from . import counters, images, resize
+from .models import Post, ThumbnailTask
+
+
+def image_storage():
+    return Post._meta.get_field("image").storage
+
+
+def image_file(name):
+    """ImageFile картинки поста с тем же ключом kvstore, что и в шаблонах."""
+    return ImageFile(name, image_storage())
+
+
+def placeholder(name):
+    """Заглушка картинки поста (см. images.placeholder) или пустая
+    строка, если картинки нет или ее не удалось прочитать."""
+    if not name:
+        return ""
+    try:
+        with image_storage().open(name) as file:
+            return images.placeholder(file)
+    except (OSError, SyntaxError, ValueError, SuspiciousFileOperation):
+        return ""
+
+
+def fill_placeholders(name):
+    """Проставляет заглушку постам с картинкой name, у которых ее еще
+    нет (ее считает воркер миниатюр, а reprocess_media - старым
+    постам). Возвращает 1, если заглушка понадобилась, иначе 0."""
+    posts = Post.objects.filter(image=name, placeholder="")
+    if not name or not posts.exists():
+        return 0
+    posts.update(placeholder=placeholder(name))
+    counters.revise(Post.objects.filter(image=name))
+    return 1
+
+
+def release(name):
+    """Удаляет картинку, ее миниатюры и варианты, если на нее не ссылается
+    ни один пост. Возвращает, удалена ли картинка.
+
+    Файл моложе POSTS_MEDIA_MIN_AGE остается gc_media: ту же картинку
+    могли только что загрузить для поста, который еще не сохранен.
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    try:
+        path = image_storage().path(name)
+    except SuspiciousFileOperation:
+        # Файл вне MEDIA_ROOT хранилищу не принадлежит.
+        return False
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        age = None
+    if age is not None and age < settings.POSTS_MEDIA_MIN_AGE:
+        return False
+    default.kvstore.delete(image_file(name))
+    ThumbnailTask.objects.filter(image=name).delete()
+    resize.delete(name)
+    image_storage().delete(name)
+    return True
+
+
+def release_on_commit(name):
+    if name:
+        transaction.on_commit(lambda: release(name))
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_followers(apps, schema_editor):
+    Follow = apps.get_model("posts", "Follow")
+    UserStats = apps.get_model("posts", "UserStats")
+    followers = (
+        Follow.objects.order_by()
+        .values("author_id")
+        .annotate(total=models.Count("id"))
+    )
+    UserStats.objects.bulk_create(
+        UserStats(user_id=row["author_id"], followers_count=row["total"])
+        for row in followers
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0011_update_proxy_permissions"),
+        ("posts", "0008_feedentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("followers_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_followers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0013_post_revision"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThumbnailTask",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                ("image", models.CharField(max_length=255)),
+                ("geometry", models.CharField(max_length=64)),
+                ("options", models.TextField(default="{}")),
+                ("started", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["created", "id"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="thumbnailtask",
+            constraint=models.UniqueConstraint(
+                fields=("image", "geometry", "options"),
+                name="unique_thumbnail_task",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0015_content_addressed_images"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="placeholder",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
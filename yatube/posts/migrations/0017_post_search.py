@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0016_post_placeholder"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE posts_post_search USING fts5("
+                "text, author, group_title, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='3 4')",
+                "INSERT INTO posts_post_search "
+                "(rowid, text, author, group_title) "
+                "SELECT post.id, post.text, author.username, "
+                "COALESCE(grp.title, '') "
+                "FROM posts_post AS post "
+                "JOIN auth_user AS author ON author.id = post.author_id "
+                "LEFT JOIN posts_group AS grp ON grp.id = post.group_id",
+            ],
+            reverse_sql=["DROP TABLE posts_post_search"],
+        ),
+    ]
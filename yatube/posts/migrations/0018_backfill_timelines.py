@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_timelines(apps, schema_editor):
+    """Заполняет ленты по уже существующим подпискам, как
+    rebuild_timelines: последние FEED_TIMELINE_LENGTH постов, без
+    популярных авторов в гибридном режиме."""
+    if settings.FEED_MODE not in ("push", "hybrid"):
+        return
+    FeedEntry = apps.get_model("posts", "FeedEntry")
+    Follow = apps.get_model("posts", "Follow")
+    Post = apps.get_model("posts", "Post")
+    follows = Follow.objects.all()
+    if settings.FEED_MODE == "hybrid":
+        follows = follows.exclude(
+            author__stats__followers_count__gte=(
+                settings.FEED_CELEBRITY_THRESHOLD
+            )
+        )
+    user_ids = follows.order_by().values_list("user_id", flat=True)
+    for user_id in user_ids.distinct().iterator():
+        authors = follows.filter(user_id=user_id).values("author_id")
+        posts = (
+            Post.objects.filter(author_id__in=authors)
+            .order_by("-pub_date", "-id")
+            .values_list("id", "pub_date")
+        )
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+                for post_id, pub_date in posts[: settings.FEED_TIMELINE_LENGTH]
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0017_post_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,22 +1,27 @@
 from django.db import models
-from core.models import CreatedModel
+from core.models import CountersModel, CreatedModel
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
-class Group(models.Model):
+class Group(CountersModel):
     title = models.CharField(max_length=200)
     slug = models.SlugField(
         max_length=255, unique=True, db_index=True, verbose_name="URL"
     )
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ("posts_count",)
 
     def __str__(self) -> str:
         return self.title
 
 
-class Post(models.Model):
+class Post(CountersModel):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(
@@ -26,13 +31,41 @@ class Post(models.Model):
         Group, blank=True, null=True, on_delete=models.SET_NULL
     )
 
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка",
+        upload_to="posts/",
+        blank=True,
+        storage=ContentAddressedStorage(),
+    )
+    # Крошечная копия картинки (data: URI), которая видна до ее загрузки.
+    placeholder = models.TextField(blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    # Растет при любом изменении, от которого зависит карточка поста:
+    # по (id, revision) она кэшируется.
+    revision = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ("comments_count", "revision")
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="post_pub_date_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="post_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="post_group_pub_date_idx",
+            ),
+            # Сколько постов ссылается на файл картинки.
+            models.Index(fields=["image"], name="post_image_idx"),
+        ]
 
 
 class Comment(CreatedModel):
@@ -48,6 +81,15 @@ class Comment(CreatedModel):
         related_name="comments",
     )
 
+    class Meta:
+        ordering = ["created", "id"]
+        indexes = [
+            models.Index(
+                fields=["post", "created", "id"],
+                name="comment_post_created_idx",
+            )
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -66,3 +108,69 @@ class Follow(models.Model):
                 ], name='unique_follow_rec'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["author", "user"], name="follow_author_user_idx"
+            )
+        ]
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, которые дорого считать через COUNT(*)."""
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class FeedEntry(models.Model):
+    """Запись в ленте подписчика: пост автора, на которого он подписан.
+
+    Ленты заполняются при публикации поста (fan-out on write), поэтому
+    follow_index читает одну ленту по индексу, а не собирает посты
+    всех авторов подпиской.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline"
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-pub_date", "-post_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_feed_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="feed_user_pub_date_idx",
+            )
+        ]
+
+
+class ThumbnailTask(CreatedModel):
+    """Миниатюра картинки, которую еще предстоит сгенерировать."""
+
+    image = models.CharField(max_length=255)
+    geometry = models.CharField(max_length=64)
+    options = models.TextField(default="{}")
+    started = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["created", "id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["image", "geometry", "options"],
+                name="unique_thumbnail_task",
+            )
+        ]
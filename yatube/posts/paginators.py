@@ -0,0 +1,279 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import (
+    EmptyPage,
+    Page,
+    PageNotAnInteger,
+    Paginator,
+)
+from django.db.models import Max, Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from . import versions
+
+POSTS_PER_PAGE = 10
+# Комментарии поста: новые сверху, по индексу comment_post_created_idx.
+COMMENT_ORDERING = ("-created", "-id")
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+def seek(ordering, values, reverse=False):
+    """Условие «строго после ключа» в порядке ordering (или обратном)."""
+    fields = [field.lstrip("-") for field in ordering]
+    condition = Q()
+    for position, field in enumerate(ordering):
+        lookup = "lt" if field.startswith("-") != reverse else "gt"
+        step = Q(**{f"{fields[position]}__{lookup}": values[position]})
+        for previous, value in zip(fields, values[:position]):
+            step &= Q(**{previous: value})
+        condition |= step
+    return condition
+
+
+def reverse_ordering(ordering):
+    return [
+        field[1:] if field.startswith("-") else "-" + field
+        for field in ordering
+    ]
+
+
+def fetch(queryset, ordering, values=None, reverse=False, limit=None):
+    """Первые limit строк queryset после ключа values."""
+    if values is not None:
+        queryset = queryset.filter(seek(ordering, values, reverse))
+    if reverse:
+        ordering = reverse_ordering(ordering)
+    return list(queryset.order_by(*ordering)[:limit])
+
+
+class CursorPage(Page):
+    """Страница ленты, полученная по курсору, а не по номеру.
+
+    cursor - разобранный курсор страницы (направление, значения ключа)
+    или None для первой страницы и нечитаемого курсора.
+    """
+
+    def __init__(
+        self, object_list, paginator, next_cursor, previous_cursor, cursor=None
+    ):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.cursor = cursor
+
+    def __repr__(self):
+        return "<Cursor page>"
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-паджинация: WHERE (pub_date, id) < (...) LIMIT n.
+
+    В отличие от Paginator не делает ни OFFSET, ни COUNT(*), поэтому
+    тысячная страница стоит столько же, сколько первая. Кроме QuerySet
+    принимает ленты из posts.timeline: у них свой метод fetch().
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list, per_page, ordering=None):
+        self.model = object_list.model
+        self.ordering = ordering or self.model._meta.ordering
+        self.fields = [field.lstrip("-") for field in self.ordering]
+        if isinstance(object_list, QuerySet):
+            object_list = object_list.order_by(*self.ordering)
+        super().__init__(object_list, per_page)
+
+    def key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field] for field in self.fields]
+        return [getattr(obj, field) for field in self.fields]
+
+    def encode_cursor(self, direction, obj):
+        values = [
+            value.isoformat() if hasattr(value, "isoformat") else str(value)
+            for value in self.key(obj)
+        ]
+        raw = "|".join([direction] + values)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, значения ключа) или None."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            direction, *values = raw.split("|")
+            if direction not in (NEXT, PREVIOUS):
+                return None
+            if len(values) != len(self.fields):
+                return None
+            return direction, [
+                self.to_python(field, value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                ValidationError):
+            return None
+
+    def to_python(self, field, value):
+        return self.model._meta.get_field(field).to_python(value)
+
+    def fetch(self, values, reverse, limit):
+        if isinstance(self.object_list, QuerySet):
+            return fetch(
+                self.object_list, self.ordering, values, reverse, limit
+            )
+        return self.object_list.fetch(values, reverse, limit)
+
+    def get_page(self, cursor):
+        decoded = self.decode_cursor(cursor)
+        limit = self.per_page + 1
+        if decoded is None:
+            rows = self.fetch(None, False, limit)
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[: self.per_page]
+        elif decoded[0] == NEXT:
+            rows = self.fetch(decoded[1], False, limit)
+            has_next, has_previous = len(rows) > self.per_page, True
+            rows = rows[: self.per_page]
+        else:
+            rows = self.fetch(decoded[1], True, limit)
+            has_next, has_previous = True, len(rows) > self.per_page
+            rows = rows[: self.per_page][::-1]
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(NEXT, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(PREVIOUS, rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor, decoded)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает больше
+    POSTS_COUNT_ESTIMATE_THRESHOLD строк: для всей таблицы берется
+    оценка по MAX(id), для выборки - сам порог. Так COUNT стоит
+    одинаково при любом размере таблицы.
+
+    При оценке с последней страницы дальше ведет курсор (next_cursor),
+    а номер за оценкой или пустая страница внутри нее (после удалений
+    MAX(id) завышает число) дают EmptyPage, а не последнюю страницу.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_estimated = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        count, self.is_estimated = self.estimate()
+        return count
+
+    def estimate(self):
+        """(число объектов, оценка ли это)."""
+        threshold = settings.POSTS_COUNT_ESTIMATE_THRESHOLD
+        queryset = self.object_list.order_by()
+        capped = queryset[: threshold + 1].count()
+        if capped <= threshold:
+            return capped, False
+        if not queryset.query.where:
+            return queryset.aggregate(top=Max("pk"))["top"], True
+        return threshold, True
+
+    def limit(self, max_pages):
+        """Номерами отдаются только первые max_pages страниц, дальше с
+        последней из них ведет курсор, как за оценкой числа объектов.
+        """
+        limit = max_pages * self.per_page
+        if self.count > limit:
+            self.count, self.is_estimated = limit, True
+
+    def get_page(self, number):
+        try:
+            number = self.validate_number(number)
+        except PageNotAnInteger:
+            number = 1
+        except EmptyPage:
+            if self.is_estimated:
+                raise
+            number = self.num_pages
+        return self.page(number)
+
+    def page(self, number):
+        page = super().page(number)
+        page.next_cursor = None
+        if not self.is_estimated:
+            return page
+        if not page.object_list and page.number > 1:
+            raise EmptyPage("За оценкой числа объектов страниц нет")
+        if page.number == self.num_pages and page.object_list:
+            keyset = CursorPaginator(self.object_list, self.per_page)
+            page.next_cursor = keyset.encode_cursor(NEXT, page[-1])
+        return page
+
+
+class CachedCountPaginator(EstimatedCountPaginator):
+    """EstimatedCountPaginator, который не считает COUNT(*) на каждый
+    запрос: число объектов кэшируется по тексту SQL-запроса на
+    POSTS_COUNT_CACHE_TIMEOUT секунд и сбрасывается при создании и
+    удалении постов.
+    """
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        try:
+            sql = str(self.object_list.query).encode()
+        except EmptyResultSet:
+            return 0
+        key = "posts:count:{}:{}".format(
+            versions.get(versions.COUNTS), hashlib.md5(sql).hexdigest()
+        )
+        cached = cache.get(key)
+        if cached is None:
+            cached = self.estimate()
+            cache.set(key, cached, settings.POSTS_COUNT_CACHE_TIMEOUT)
+        count, self.is_estimated = cached
+        return count
+
+
+def paginate(
+    request, object_list, per_page=POSTS_PER_PAGE, count=None, max_pages=None
+):
+    """Страница ленты: по ?cursor= (keyset) или по ?page= (номер).
+
+    count - заранее известное число объектов (например, из счетчика),
+    с ним Paginator не делает COUNT(*). max_pages ограничивает номерные
+    страницы, дальше лента листается курсором. Номер за оценкой числа
+    объектов или за max_pages - 404.
+    """
+    if "cursor" in request.GET:
+        return CursorPaginator(object_list, per_page).get_page(
+            request.GET["cursor"]
+        )
+    paginator = CachedCountPaginator(object_list, per_page)
+    if count is not None:
+        paginator.count = count
+    if max_pages is not None:
+        paginator.limit(max_pages)
+    try:
+        return paginator.get_page(request.GET.get("page"))
+    except EmptyPage:
+        raise Http404
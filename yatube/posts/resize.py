@@ -0,0 +1,161 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from . import media
+from .models import ThumbnailTask
+
+# Имя из ContentAddressedStorage уже содержит SHA-256 содержимого.
+CONTENT_HASH = re.compile(r"^[0-9a-f]{64}$")
+# Расширение исходника -> (формат, MIME, расширение варианта). Из GIF
+# берется первый кадр и сохраняется в PNG.
+FORMATS = {
+    ".jpg": ("JPEG", "image/jpeg", ".jpg"),
+    ".jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    ".png": ("PNG", "image/png", ".png"),
+    ".gif": ("PNG", "image/png", ".png"),
+    ".webp": ("WEBP", "image/webp", ".webp"),
+}
+# Общий набор файлов блокировок: их число не растет с числом вариантов.
+LOCKS = 256
+# Опции задачи очереди миниатюр, которая готовит вариант, а не
+# миниатюру sorl (см. thumbnails.enqueue_post).
+TASK_OPTIONS = {"resize": True}
+
+
+class Variant:
+    """Картинка поста, уменьшенная до одного из POSTS_RESIZE_SIZES."""
+
+    def __init__(self, name, width, height):
+        self.name = name
+        self.width = width
+        self.height = height
+        stem, extension = os.path.splitext(os.path.basename(name))
+        self.format, self.content_type, self.extension = FORMATS[
+            extension.lower()
+        ]
+        if CONTENT_HASH.match(stem):
+            self.digest = stem
+        else:
+            # Старые имена тоже не переиспользуются: хранилище
+            # добавляет к занятому имени суффикс.
+            self.digest = hashlib.sha256(name.encode()).hexdigest()
+        self.geometry = f"{width}x{height}"
+        self.etag = f"{self.digest}-{self.geometry}"
+        # Путь варианта относительно MEDIA_ROOT.
+        self.cache_name = os.path.join(
+            "resized",
+            self.geometry,
+            self.digest[:2],
+            self.digest[2:4],
+            self.digest + self.extension,
+        )
+        self.path = image_storage_path(self.cache_name)
+
+
+def image_storage_path(name):
+    return media.image_storage().path(name)
+
+
+def allowed(name, width, height):
+    """Размер из POSTS_RESIZE_SIZES, а формат картинки поддерживается."""
+    extension = os.path.splitext(name)[1].lower()
+    return (
+        f"{width}x{height}" in settings.POSTS_RESIZE_SIZES
+        and extension in FORMATS
+    )
+
+
+@contextmanager
+def locked(digest):
+    """Блокировка вариантов с таким хэшем между потоками и процессами."""
+    directory = image_storage_path(os.path.join("resized", ".locks"))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{int(digest[:4], 16) % LOCKS:03}.lock")
+    with open(path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def render(variant):
+    """Уменьшает картинку с обрезкой по центру и пишет в кэш на диске."""
+    source = image_storage_path(variant.name)
+    with Image.open(source) as image:
+        image.seek(0)
+        resized = ImageOps.fit(
+            image.convert("RGBA" if variant.format != "JPEG" else "RGB"),
+            (variant.width, variant.height),
+            Image.LANCZOS,
+        )
+    options = {}
+    if variant.format == "JPEG":
+        options.update(
+            quality=settings.POSTS_IMAGE_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    directory = os.path.dirname(variant.path)
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+    try:
+        resized.save(temporary, variant.format, **options)
+        os.replace(temporary, variant.path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def resized(name, width, height):
+    """Вариант картинки, который есть на диске.
+
+    Недостающий вариант генерируется под блокировкой, так что
+    одновременные запросы одного размера уменьшают картинку один раз.
+    """
+    variant = Variant(name, width, height)
+    if os.path.exists(variant.path):
+        return variant
+    with locked(variant.digest):
+        if not os.path.exists(variant.path):
+            render(variant)
+    return variant
+
+
+def delete(name):
+    """Удаляет с диска варианты картинки всех POSTS_RESIZE_SIZES."""
+    for size in settings.POSTS_RESIZE_SIZES:
+        width, height = (int(side) for side in size.split("x"))
+        if not allowed(name, width, height):
+            continue
+        variant = Variant(name, width, height)
+        with locked(variant.digest):
+            if os.path.exists(variant.path):
+                os.remove(variant.path)
+
+
+def generate(name):
+    """Генерирует недостающие варианты картинки всех POSTS_RESIZE_SIZES.
+    Возвращает число новых вариантов."""
+    created = 0
+    for size in settings.POSTS_RESIZE_SIZES:
+        width, height = (int(side) for side in size.split("x"))
+        if not allowed(name, width, height):
+            continue
+        variant = Variant(name, width, height)
+        if os.path.exists(variant.path):
+            continue
+        resized(name, width, height)
+        created += 1
+    ThumbnailTask.objects.filter(
+        image=name, options=json.dumps(TASK_OPTIONS, sort_keys=True)
+    ).delete()
+    return created
@@ -0,0 +1,126 @@
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Group, Post, User
+from .paginators import CursorPaginator
+
+# Таблица FTS5 (миграция 0017): rowid - id поста.
+TABLE = "posts_post_search"
+# Сколько слов запроса учитывается.
+MAX_TERMS = 8
+# Короче слова ищутся целиком: префикс из двух букв совпадает почти со
+# всеми постами, и их ранжирование стоит сотни миллисекунд.
+MIN_PREFIX = 3
+WORD = re.compile(r"\w+")
+
+INDEX_SQL = (
+    f"INSERT INTO {TABLE} (rowid, text, author, group_title) "
+    "SELECT post.id, post.text, author.username, COALESCE(grp.title, '') "
+    f"FROM {Post._meta.db_table} AS post "
+    f"JOIN {User._meta.db_table} AS author ON author.id = post.author_id "
+    f"LEFT JOIN {Group._meta.db_table} AS grp ON grp.id = post.group_id"
+)
+
+
+def match_expression(query):
+    """Запрос FTS5 из текста пользователя: все слова должны найтись,
+    длинные - как префиксы (кот -> кота, коты). Слова берутся в
+    кавычки, так что синтаксис FTS5 из ввода не работает."""
+    words = WORD.findall(query.lower())[:MAX_TERMS]
+    return " ".join(
+        f'"{word}"*' if len(word) >= MIN_PREFIX else f'"{word}"'
+        for word in words
+    )
+
+
+def matching_ids(query):
+    """Подзапрос id постов по запросу - для filter(pk__in=...)."""
+    return RawSQL(
+        f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s",
+        (match_expression(query),),
+    )
+
+
+def reindex(posts):
+    """Обновляет в индексе посты из queryset posts."""
+    try:
+        sql, params = posts.order_by().values("pk").query.sql_with_params()
+    except EmptyResultSet:
+        # Например, pk__in=[] у группы без постов: обновлять нечего.
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({sql})", params)
+        cursor.execute(f"{INDEX_SQL} WHERE post.id IN ({sql})", params)
+
+
+def remove(post_ids):
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", post_ids
+        )
+
+
+def rebuild():
+    """Собирает индекс заново и возвращает число постов в нем."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(INDEX_SQL)
+        count = cursor.rowcount
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+class SearchResults:
+    """Посты по запросу в порядке релевантности (bm25) для
+    SearchPaginator: ключ страницы - (ранг, id)."""
+
+    model = Post
+    ordering = ["search_rank", "id"]
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+
+    def fetch(self, values, reverse, limit):
+        if not self.expression:
+            return []
+        sql = f"SELECT rowid, rank FROM {TABLE} WHERE {TABLE} MATCH %s"
+        params = [self.expression]
+        direction = "DESC" if reverse else "ASC"
+        if values is not None:
+            after = "<" if reverse else ">"
+            sql += (
+                f" AND (rank {after} %s"
+                f" OR (rank = %s AND rowid {after} %s))"
+            )
+            params += [values[0], values[0], values[1]]
+        sql += f" ORDER BY rank {direction}, rowid {direction} LIMIT %s"
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        posts = Post.objects.select_related("author", "group").in_bulk(
+            [post_id for post_id, _ in rows]
+        )
+        found = []
+        for post_id, rank in rows:
+            if post_id in posts:
+                posts[post_id].search_rank = rank
+                found.append(posts[post_id])
+        return found
+
+
+class SearchPaginator(CursorPaginator):
+    def __init__(self, results, per_page):
+        super().__init__(results, per_page, ordering=results.ordering)
+
+    def to_python(self, field, value):
+        if field == "search_rank":
+            return float(value)
+        return super().to_python(field, value)
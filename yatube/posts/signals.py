@@ -0,0 +1,155 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import (
+    counters,
+    feeds,
+    media,
+    search,
+    thumbnails,
+    timeline,
+    versions,
+)
+from .models import Comment, Follow, Group, Post, User
+
+# Поля автора, которые выводятся в карточке поста.
+AUTHOR_FIELDS = ("username", "first_name", "last_name")
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw, **kwargs):
+    instance._old_group_id = instance._old_image = None
+    if not instance._state.adding and not raw:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("group_id", "image")
+            .first()
+        ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    versions.bump(versions.FEED)
+    if instance.image.name != instance._old_image:
+        media.release_on_commit(instance._old_image)
+        # Заглушку новой картинки считает воркер миниатюр, а не запрос.
+        if instance.placeholder:
+            instance.placeholder = ""
+            Post.objects.filter(pk=instance.pk).update(placeholder="")
+        if instance.image:
+            thumbnails.enqueue_post(instance)
+    search.reindex(Post.objects.filter(pk=instance.pk))
+    feeds.bump_post(instance, instance._old_group_id)
+    if created:
+        counters.bump(instance.author_id, "posts_count", 1)
+        counters.bump_group(instance.group_id, 1)
+        versions.bump(versions.COUNTS)
+        timeline.fan_out(instance)
+        return
+    if instance._old_group_id != instance.group_id:
+        counters.bump_group(instance._old_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+    counters.revise(Post.objects.filter(pk=instance.pk))
+    timeline.touch(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump(instance.author_id, "posts_count", -1)
+    counters.bump_group(instance.group_id, -1)
+    media.release_on_commit(instance.image.name)
+    search.remove([instance.pk])
+    feeds.bump_post(instance)
+    versions.bump(versions.COUNTS)
+    versions.bump(versions.FEED)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump(instance.user_id, "following_count", 1)
+        followers = counters.bump(instance.author_id, "followers_count", 1)
+        timeline.followers_changed(instance.author_id, followers, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump(instance.user_id, "following_count", -1)
+    followers = counters.bump(instance.author_id, "followers_count", -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.followers_changed(instance.author_id, followers, -1)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw, update_fields=None, **kwargs):
+    instance._renamed = False
+    if instance._state.adding or raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        AUTHOR_FIELDS
+    ):
+        return
+    old = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*AUTHOR_FIELDS)
+        .first()
+    )
+    instance._renamed = old != tuple(
+        getattr(instance, field) for field in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if getattr(instance, "_renamed", False):
+        counters.revise(Post.objects.filter(author=instance))
+        search.reindex(Post.objects.filter(author=instance))
+        versions.bump(feeds.ALL)
+        versions.bump(versions.FEED)
+        versions.bump(versions.NAMES)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    feeds.bump(feeds.group_scope(instance.slug))
+    if not created:
+        # Название группы выводится и в лентах сайта и авторов.
+        versions.bump(feeds.ALL)
+        versions.bump(versions.FEED)
+        counters.revise(Post.objects.filter(group=instance))
+        search.reindex(Post.objects.filter(group=instance))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Удаление идет в одной транзакции с SET NULL у постов группы,
+    # поэтому новую revision никто не увидит раньше пустой группы.
+    counters.revise(Post.objects.filter(group=instance))
+    # После SET NULL посты группы уже не найти, запоминаем их сейчас.
+    instance._post_ids = list(
+        Post.objects.filter(group=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    feeds.bump(feeds.group_scope(instance.slug))
+    versions.bump(versions.FEED)
+    search.reindex(Post.objects.filter(pk__in=instance._post_ids))
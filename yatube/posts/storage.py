@@ -0,0 +1,48 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по SHA-256 содержимого.
+
+    posts/photo.jpg сохраняется как posts/ab/cd/<sha256>.jpg: одинаковые
+    загрузки ложатся в один файл (и получают один набор миниатюр), а два
+    уровня каталогов держат их размер ограниченным.
+    """
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя все равно вычисляется по содержимому в _save().
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = self.hashed_name(name, digest.hexdigest())
+        try:
+            # Файл уже есть: обновляем mtime, чтобы release и gc_media
+            # не удалили его, пока пост с этой картинкой не сохранен.
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # Пишем во временный файл и переименовываем: параллельная
+        # загрузка того же содержимого перезапишет файл тем же самым.
+        temporary = super()._save(
+            os.path.join(os.path.dirname(name), f".{uuid.uuid4().hex}.tmp"),
+            content,
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,61 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from posts import resize, thumbnails
+
+CARD_TEMPLATE = "posts/includes/post_card.html"
+
+register = template.Library()
+
+
+def card_key(post):
+    return f"posts:card:{post.id}:{post.revision}"
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Пары (пост, HTML карточки) для страницы ленты.
+
+    Карточки всей страницы читаются из кэша одним get_many, рендерятся
+    только недостающие, а их миниатюры поднимаются из kvstore одним
+    пакетом. Ключ включает revision поста, поэтому правки поста, имени
+    автора и группы сразу дают новую карточку.
+    """
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cached = cache.get_many(keys)
+    missing = [post for post, key in zip(posts, keys) if key not in cached]
+    rendered = {}
+    with thumbnails.prefetch(missing):
+        for post in missing:
+            rendered[card_key(post)] = render_to_string(
+                CARD_TEMPLATE, {"post": post}
+            )
+    cards = [
+        (post, mark_safe(cached.get(key) or rendered[key]))
+        for post, key in zip(posts, keys)
+    ]
+    if rendered:
+        cache.set_many(rendered, settings.POSTS_CARD_CACHE_TIMEOUT)
+    return cards
+
+
+@register.filter
+def srcset(image):
+    """srcset картинки поста из вариантов POSTS_RESIZE_SIZES."""
+    if not image:
+        return ""
+    candidates = []
+    for size in settings.POSTS_RESIZE_SIZES:
+        width, height = (int(side) for side in size.split("x"))
+        if resize.allowed(image.name, width, height):
+            url = reverse(
+                "posts:resized_image",
+                kwargs={"width": width, "height": height, "name": image.name},
+            )
+            candidates.append((width, f"{url} {width}w"))
+    return ", ".join(candidate for _, candidate in sorted(candidates))
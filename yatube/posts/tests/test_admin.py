@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangeListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="-"
+        )
+        cls.user = User.objects.create_user(username="leo_tolstoy")
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+
+    def add_rows(self, count):
+        start = Post.objects.count()
+        for cnt in range(start, start + count):
+            author = User.objects.create_user(username=f"writer_{cnt}")
+            group = Group.objects.create(
+                title=f"Группа {cnt}", slug=f"group-{cnt}", description="-"
+            )
+            post = Post.objects.create(
+                author=author, text=f"Пост {cnt}", group=group
+            )
+            Comment.objects.create(author=self.user, post=post, text="-")
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.admin_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_budget_does_not_grow(self):
+        """число запросов списка не зависит от числа строк"""
+        urls = [
+            reverse("admin:posts_post_changelist"),
+            reverse("admin:posts_post_changelist") + "?author=leo_tolstoy",
+            reverse("admin:posts_post_changelist") + "?pub_date__year=2030",
+            reverse("admin:posts_comment_changelist"),
+            reverse("admin:posts_group_changelist"),
+        ]
+        self.add_rows(2)
+        before = [self.queries(url) for url in urls]
+        self.add_rows(15)
+        self.assertEqual([self.queries(url) for url in urls], before)
+
+    def test_author_filter(self):
+        """фильтр по автору - поле ввода, а не список пользователей"""
+        self.add_rows(3)
+        Post.objects.create(author=self.user, text="Война и мир")
+        url = reverse("admin:posts_post_changelist")
+        response = self.admin_client.get(url, {"author": "leo_tolstoy"})
+        self.assertEqual(
+            [post.text for post in response.context["cl"].result_list],
+            ["Война и мир"],
+        )
+        self.assertContains(response, 'value="leo_tolstoy"')
+        self.assertNotContains(response, "?author=writer_0")
+
+    @override_settings(POSTS_COUNT_ESTIMATE_THRESHOLD=5)
+    def test_count_is_estimated(self):
+        """после порога число строк в админке оценивается"""
+        self.add_rows(7)
+        response = self.admin_client.get(
+            reverse("admin:posts_comment_changelist")
+        )
+        self.assertTrue(response.context["cl"].paginator.is_estimated)
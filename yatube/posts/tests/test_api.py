@@ -0,0 +1,117 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="leo_tolstoy")
+        cls.group = Group.objects.create(
+            title="Котоводы", slug="cats", description="Про котов"
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f"Пост {cnt}"
+            )
+            for cnt in range(13)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        """ленты отдаются страницами по курсору"""
+        for url in (
+            reverse("posts:api_index"),
+            reverse("posts:api_group_posts", args=["cats"]),
+            reverse("posts:api_profile_posts", args=["leo_tolstoy"]),
+        ):
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(len(first["results"]), 10)
+                self.assertEqual(first["results"][0]["text"], "Пост 12")
+                second = self.client.get(url, {"cursor": first["next"]}).json()
+                self.assertEqual(len(second["results"]), 3)
+                self.assertIsNone(second["next"])
+        response = self.client.get(
+            reverse("posts:api_profile_posts", args=["leo_tolstoy"])
+        )
+        self.assertEqual(response.json()["author"]["posts_count"], 13)
+
+    def test_not_modified(self):
+        """совпавший ETag - 304 без чтения самих постов"""
+        url = reverse("posts:api_index")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_etag_follows_changes(self):
+        """правка поста и новый комментарий меняют ETag"""
+        urls = [
+            reverse("posts:api_index"),
+            reverse("posts:api_post_detail", args=[self.posts[12].pk]),
+        ]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        post = self.posts[12]
+        post.text = "Исправленный пост"
+        post.save()
+        edited = [self.client.get(url)["ETag"] for url in urls]
+        Comment.objects.create(author=self.user, post=post, text="Браво")
+        commented = [self.client.get(url)["ETag"] for url in urls]
+        for before, after, last in zip(etags, edited, commented):
+            self.assertEqual(len({before, after, last}), 3)
+
+    def test_etag_follows_commenter_rename(self):
+        """переименование комментатора меняет ETag поста"""
+        reader = User.objects.create_user(username="reader")
+        post = self.posts[0]
+        Comment.objects.create(author=reader, post=post, text="Браво")
+        url = reverse("posts:api_post_detail", args=[post.pk])
+        etag = self.client.get(url)["ETag"]
+        reader.username = "critic"
+        reader.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["comments"][0]["author"], "critic")
+
+    def test_post_detail(self):
+        """пост с комментариями; несуществующий - 404"""
+        post = self.posts[0]
+        Comment.objects.create(author=self.user, post=post, text="Браво")
+        data = self.client.get(
+            reverse("posts:api_post_detail", args=[post.pk])
+        ).json()
+        self.assertEqual(data["text"], "Пост 0")
+        self.assertEqual(data["group"], "cats")
+        self.assertEqual(data["comments"][0]["text"], "Браво")
+        response = self.client.get(
+            reverse("posts:api_post_detail", args=[10**6])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk(self):
+        """посты по списку id в его порядке, лишние пропущены"""
+        url = reverse("posts:api_posts_bulk")
+        ids = [self.posts[3].pk, self.posts[1].pk, 10**6]
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"ids": ",".join(map(str, ids))})
+        self.assertEqual(
+            [post["text"] for post in response.json()["results"]],
+            ["Пост 3", "Пост 1"],
+        )
+        self.assertEqual(self.client.get(url, {"ids": "1,x"}).status_code, 400)
+
+    def test_smaller_than_html(self):
+        """JSON ленты заметно меньше HTML той же страницы"""
+        api = self.client.get(reverse("posts:api_index"))
+        html = self.client.get(reverse("posts:index"))
+        self.assertLess(len(api.content) * 2, len(html.content))
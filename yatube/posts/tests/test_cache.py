@@ -4,6 +4,7 @@ from django.utils import timezone
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.cache import cache
+from django.db.models import F
 
 
 User = get_user_model()
@@ -29,10 +30,14 @@ class CacheTests(TestCase):
 
         cls.guest_client = Client()
 
+    def setUp(self):
+        cache.clear()
+
     def test_no_renewal_while_delay(self):
         """Кэш существует?"""
         content_before = self.guest_client.get(reverse("posts:index")).content
-        Post.objects.get(id=self.post.id).delete()
+        # update() не шлет сигналов, поэтому версия ленты не меняется.
+        Post.objects.filter(id=self.post.id).update(text="Новый текст")
         content_after = self.guest_client.get(reverse("posts:index")).content
         self.assertEqual(content_before, content_after)
 
@@ -42,3 +47,67 @@ class CacheTests(TestCase):
         cache.clear()
         content_after = self.guest_client.get(reverse("posts:index")).content
         self.assertEqual(content_before, content_after)
+
+    def test_new_post_shows_up_at_once(self):
+        """Новый пост виден на главной сразу, без ожидания кэша?"""
+        self.guest_client.get(reverse("posts:index"))
+        Post.objects.create(author=self.user, text="Свежий пост")
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertContains(response, "Свежий пост")
+
+    def test_deleted_post_disappears(self):
+        """Удаленный пост пропадает с главной сразу?"""
+        self.guest_client.get(reverse("posts:index"))
+        Post.objects.get(id=self.post.id).delete()
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertNotContains(response, "Тестовый текст")
+
+    def test_edited_post_is_renewed(self):
+        """Отредактированный пост обновляется на главной сразу?"""
+        self.guest_client.get(reverse("posts:index"))
+        post = Post.objects.get(id=self.post.id)
+        post.text = "Исправленный текст"
+        post.save()
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertContains(response, "Исправленный текст")
+
+    def test_pages_are_cached_separately(self):
+        """Вторая страница не отдается из кэша первой?"""
+        for cnt in range(10):
+            Post.objects.create(author=self.user, text=f"Пост номер {cnt}")
+        first = self.guest_client.get(reverse("posts:index"))
+        second = self.guest_client.get(reverse("posts:index") + "?page=2")
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, "Тестовый текст")
+        self.assertNotContains(first, "Тестовый текст")
+
+        first = self.guest_client.get(reverse("posts:index") + "?cursor=")
+        cursor = first.context["page_obj"].next_cursor
+        response = self.guest_client.get(
+            reverse("posts:index") + f"?cursor={cursor}"
+        )
+        self.assertContains(response, "Тестовый текст")
+
+    def test_broken_cursors_share_cache_entry(self):
+        """Нечитаемые курсоры не заводят свои записи кэша?"""
+        url = reverse("posts:index")
+        self.guest_client.get(url + "?cursor=broken")
+        Post.objects.filter(id=self.post.id).update(
+            text="Новый текст", revision=F("revision") + 1
+        )
+        response = self.guest_client.get(url + "?cursor=another")
+        self.assertNotContains(response, "Новый текст")
+
+    def test_guests_and_users_cached_separately(self):
+        """Гости и авторизованные читают разные записи кэша?"""
+        self.guest_client.get(reverse("posts:index"))
+        # Новая revision обходит кэш карточки, но не версию ленты.
+        Post.objects.filter(id=self.post.id).update(
+            text="Новый текст", revision=F("revision") + 1
+        )
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        response = authorized_client.get(reverse("posts:index"))
+        self.assertContains(response, "Новый текст")
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertNotContains(response, "Новый текст")
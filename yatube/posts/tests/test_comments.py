@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(POSTS_COMMENTS_PER_PAGE=5)
+class CommentsPageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="leo_tolstoy")
+        cls.post = Post.objects.create(author=cls.user, text="Кот спит")
+        for cnt in range(12):
+            Comment.objects.create(
+                author=cls.user, post=cls.post, text=f"Коммент {cnt}"
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_first_page(self):
+        """на странице поста только первая пачка, новые сверху"""
+        url = reverse("posts:post_detail", args=[self.post.pk])
+        response = self.client.get(url)
+        comments = response.context["comments"]
+        self.assertEqual(
+            self.texts(comments),
+            [f"Коммент {cnt}" for cnt in (11, 10, 9, 8, 7)],
+        )
+        self.assertEqual(comments[0].text, "Коммент 11")
+        self.assertContains(response, "Показать еще комментарии")
+        # Ссылка работает и без JS: ?comments= открывает следующую пачку.
+        response = self.client.get(url, {"comments": comments.next_cursor})
+        self.assertEqual(response.context["comments"][0].text, "Коммент 6")
+
+    def test_fragment(self):
+        """фрагмент отдает следующую пачку до последнего комментария"""
+        url = reverse("posts:post_comments", args=[self.post.pk])
+        seen = []
+        params = {}
+        for _ in range(3):
+            response = self.client.get(url, params)
+            comments = response.context["comments"]
+            seen += self.texts(comments)
+            params = {"cursor": comments.next_cursor}
+        self.assertFalse(comments.has_next())
+        self.assertNotContains(response, "Показать еще")
+        self.assertEqual(seen, [f"Коммент {cnt}" for cnt in range(11, -1, -1)])
+        self.assertTemplateNotUsed(response, "posts/post_detail.html")
+
+    def test_missing_post(self):
+        """фрагмент несуществующего поста - 404"""
+        response = self.client.get(
+            reverse("posts:post_comments", args=[10**6])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_comments(self):
+        """API отдает комментарии той же пачкой с курсором следующей"""
+        url = reverse("posts:api_post_detail", args=[self.post.pk])
+        first = self.client.get(url).json()
+        self.assertEqual(len(first["comments"]), 5)
+        self.assertEqual(first["comments"][0]["text"], "Коммент 11")
+        self.assertEqual(first["comments_count"], 12)
+        second = self.client.get(url, {"cursor": first["comments_next"]})
+        self.assertEqual(second.json()["comments"][0]["text"], "Коммент 6")
+        self.assertNotEqual(second["ETag"], self.client.get(url)["ETag"])
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="leo_tolstoy")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Котоводы", slug="cats", description="-"
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text="Кот спит на окне"
+        )
+        cls.urls = [
+            reverse("posts:group_list", args=["cats"]),
+            reverse("posts:profile", args=["leo_tolstoy"]),
+            reverse("posts:post_detail", args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def etags(self, client=None):
+        client = client or self.client
+        return [client.get(url)["ETag"] for url in self.urls]
+
+    def test_not_modified_before_page_queries(self):
+        """совпавший ETag - 304 после пары запросов по индексам"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn("no-cache", response["Cache-Control"])
+                with self.assertNumQueries(2):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response["ETag"]
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified(self):
+        """по одной дате 304 не отдается: удаление и подписка ее не двигают"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header("Last-Modified"))
+
+    def test_etag_depends_on_csrf_token(self):
+        """новый CSRF-токен после входа - новая страница с формой"""
+        url = self.urls[2]
+        self.reader_client.cookies[settings.CSRF_COOKIE_NAME] = "a" * 64
+        etag = self.reader_client.get(url)["ETag"]
+        self.reader_client.cookies[settings.CSRF_COOKIE_NAME] = "b" * 64
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "csrfmiddlewaretoken")
+
+    def test_etag_follows_changes(self):
+        """правка поста и комментарий меняют ETag страниц"""
+        before = self.etags()
+        self.post.text = "Кот проснулся"
+        self.post.save()
+        edited = self.etags()
+        self.assertTrue(all(a != b for a, b in zip(before, edited)))
+        Comment.objects.create(author=self.reader, post=self.post, text="-")
+        self.assertNotEqual(self.etags()[2], edited[2])
+
+    def test_etag_follows_renames(self):
+        """переименование автора, группы и комментатора меняет ETag"""
+        Comment.objects.create(author=self.reader, post=self.post, text="-")
+        group_page, profile, post_page = self.urls
+        author = User.objects.get(pk=self.author.pk)
+        group = Group.objects.get(pk=self.group.pk)
+        reader = User.objects.get(pk=self.reader.pk)
+        renames = [
+            (group_page, author, "first_name", "Лев"),
+            (profile, group, "slug", "kittens"),
+            (post_page, reader, "username", "critic"),
+        ]
+        for url, instance, field, value in renames:
+            with self.subTest(url=url, field=field):
+                etag = self.client.get(url)["ETag"]
+                setattr(instance, field, value)
+                instance.save()
+                self.assertNotEqual(self.client.get(url)["ETag"], etag)
+
+    def test_etag_depends_on_user(self):
+        """у гостя, читателя и подписчика разные ETag"""
+        guest = self.etags()
+        reader = self.etags(self.reader_client)
+        self.assertTrue(all(a != b for a, b in zip(guest, reader)))
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertNotEqual(self.etags(self.reader_client)[1], reader[1])
+        response = self.reader_client.get(self.urls[0])
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_missing_object(self):
+        """несуществующие объекты - по-прежнему 404"""
+        for url in (
+            reverse("posts:group_list", args=["dogs"]),
+            reverse("posts:profile", args=["nobody"]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
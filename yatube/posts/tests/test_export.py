@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import export
+from posts.models import Comment, Group, Post
+
+from .test_pics import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="leo_tolstoy")
+        group = Group.objects.create(title="Котоводы", slug="cats")
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text="Кот спит на окне",
+            group=group,
+            image=SimpleUploadedFile("small.gif", SMALL_GIF, "image/gif"),
+        )
+        Post.objects.create(author=cls.user, text="Без картинки")
+        Comment.objects.create(author=cls.user, post=cls.post, text="Браво")
+        other = User.objects.create_user(username="other")
+        Post.objects.create(author=other, text="Чужой пост")
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def download(self):
+        response = self.authorized_client.get(reverse("posts:export_account"))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        return zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+
+    def test_archive_contents(self):
+        """в архиве посты, комментарии и картинки только владельца"""
+        archive = self.download()
+        posts = [
+            json.loads(line)
+            for line in archive.read("posts.jsonl").decode().splitlines()
+        ]
+        self.assertEqual(
+            [post["text"] for post in posts],
+            ["Без картинки", "Кот спит на окне"],
+        )
+        self.assertEqual(posts[1]["group"], "cats")
+        self.assertEqual(
+            archive.read(posts[1]["image"]), self.post.image.read()
+        )
+        comment = json.loads(archive.read("comments.jsonl"))
+        self.assertEqual(comment["text"], "Браво")
+        self.assertEqual(comment["post"], self.post.pk)
+
+    def test_streamed_in_chunks(self):
+        """архив отдается мелкими кусками, а не целиком"""
+        with mock.patch.object(export, "CHUNK_SIZE", 16):
+            chunks = list(export.archive(self.user))
+        self.assertGreater(len(chunks), 3)
+        data = b"".join(chunks)
+        # Сжатые данные пишутся блоками zlib, заголовки - целиком.
+        self.assertLess(max(len(chunk) for chunk in chunks), 512)
+        self.assertIsNone(zipfile.ZipFile(BytesIO(data)).testzip())
+
+    def test_login_required(self):
+        """аноним отправляется на вход"""
+        response = Client().get(reverse("posts:export_account"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_command(self):
+        """команда пишет тот же архив в файл"""
+        path = os.path.join(TEMP_MEDIA_ROOT, "export.zip")
+        call_command(
+            "export_account", "leo_tolstoy", "-o", path, stdout=StringIO()
+        )
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(
+                sorted(archive.namelist()),
+                [
+                    "comments.jsonl",
+                    "images/" + self.post.image.name,
+                    "posts.jsonl",
+                ],
+            )
@@ -0,0 +1,129 @@
+import warnings
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username="leo_tolstoy", first_name="Лев", last_name="Толстой"
+        )
+        cls.cats = Group.objects.create(
+            title="Котоводы", slug="cats", description="Про котов"
+        )
+        cls.dogs = Group.objects.create(
+            title="Собачники", slug="dogs", description="Про собак"
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.cats, text="Кот спит на окне"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self, kind):
+        return [
+            reverse(f"posts:feed_{kind}"),
+            reverse(f"posts:group_feed_{kind}", args=["cats"]),
+            reverse(f"posts:profile_feed_{kind}", args=["leo_tolstoy"]),
+        ]
+
+    def test_feeds(self):
+        """RSS и Atom сайта, группы и автора"""
+        for kind, content_type in (
+            ("rss", "application/rss+xml"),
+            ("atom", "application/atom+xml"),
+        ):
+            for url in self.urls(kind):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertTrue(
+                        response["Content-Type"].startswith(content_type)
+                    )
+                    self.assertContains(response, "Кот спит на окне")
+                    self.assertContains(response, "Лев Толстой")
+
+    def test_cached_without_queries(self):
+        """повторный запрос ленты не ходит в базу, с ETag - 304"""
+        for url in self.urls("rss"):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_saved_posts_reach_feeds(self):
+        """новый и перенесенный в другую группу пост - сразу в лентах"""
+        for url in self.urls("rss"):
+            self.client.get(url)
+        Post.objects.create(author=self.user, group=self.cats, text="Второй")
+        for url in self.urls("rss"):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), "Второй")
+        self.client.get(reverse("posts:group_feed_rss", args=["dogs"]))
+        self.post.group = self.dogs
+        self.post.save()
+        self.assertNotContains(
+            self.client.get(reverse("posts:group_feed_rss", args=["cats"])),
+            "Кот спит на окне",
+        )
+        self.assertContains(
+            self.client.get(reverse("posts:group_feed_rss", args=["dogs"])),
+            "Кот спит на окне",
+        )
+
+    def test_deleted_posts_leave_feeds(self):
+        """удаленный пост пропадает из лент"""
+        for url in self.urls("atom"):
+            self.client.get(url)
+        Post.objects.get(pk=self.post.pk).delete()
+        for url in self.urls("atom"):
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.client.get(url), "Кот спит на окне"
+                )
+
+    def test_group_rename_reaches_all_feeds(self):
+        """новое название группы видно в лентах сайта и автора"""
+        for url in self.urls("rss"):
+            self.client.get(url)
+        group = Group.objects.get(pk=self.cats.pk)
+        group.title = "Кошатники"
+        group.save()
+        for url in self.urls("rss"):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), "Кошатники")
+
+    def test_cache_keys_are_safe(self):
+        """слаг не из ASCII не попадает в ключи кэша как есть"""
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            Post.objects.create(
+                author=self.user,
+                group=Group.objects.create(
+                    title="Тестовая", slug="Тестовый слаг" * 20
+                ),
+                text="Пост в группе с длинным слагом",
+            )
+        self.assertFalse(
+            [w for w in caught if issubclass(w.category, CacheKeyWarning)]
+        )
+
+    def test_unknown_scope(self):
+        """лента несуществующей группы - 404"""
+        response = self.client.get(
+            reverse("posts:group_feed_rss", args=["birds"])
+        )
+        self.assertEqual(response.status_code, 404)
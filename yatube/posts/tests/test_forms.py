@@ -1,10 +1,21 @@
-from django.test import Client, TestCase
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from PIL import Image
 
+from ..images import ingest
 from ..models import Comment, Post
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 User = get_user_model()
 
@@ -108,3 +119,92 @@ class TaskPostFormTests(TestCase):
             "comment text1",
             "Комментарий не появляется на post_detail",
         )
+
+
+def image_upload(name, size, image_format, **options):
+    output = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(output, image_format, **options)
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @override_settings(POSTS_IMAGE_MAX_EDGE=100)
+    def test_downscaled_rotated_and_stripped(self):
+        """Загрузка картинки: уменьшение, поворот по EXIF, без метаданных"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = "Phone"
+        upload = image_upload(
+            "photo.png", (400, 200), "PNG", exif=exif.tobytes()
+        )
+        result = ingest(upload)
+        image = Image.open(result)
+        self.assertEqual(result.name, "photo.jpg")
+        self.assertEqual(image.format, "JPEG")
+        self.assertEqual(image.size, (50, 100))
+        self.assertNotIn("exif", image.info)
+
+    def test_small_file_kept_as_is(self):
+        """Загрузка картинки: маленький файл без метаданных не трогаем"""
+        upload = SimpleUploadedFile(
+            "small.gif",
+            b"\x47\x49\x46\x38\x39\x61\x02\x00"
+            b"\x01\x00\x80\x00\x00\x00\x00\x00"
+            b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+            b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+            b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+            b"\x0A\x00\x3B",
+        )
+        self.assertIs(ingest(upload), upload)
+
+    def test_unsupported_format_rejected(self):
+        """Загрузка картинки: BMP отклоняется"""
+        with self.assertRaises(ValidationError):
+            ingest(image_upload("picture.bmp", (20, 10), "BMP"))
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Загрузка картинки: слишком большая картинка не создает пост"""
+        response = self.authorized_client.post(
+            reverse("posts:post_create"),
+            data={
+                "text": "Пост с огромной картинкой",
+                "image": image_upload("huge.png", (20, 10), "PNG"),
+            },
+        )
+        self.assertFormError(
+            response, "form", "image", "Слишком большая картинка."
+        )
+        self.assertFalse(
+            Post.objects.filter(text="Пост с огромной картинкой").exists()
+        )
+
+    def test_create_stores_processed_image(self):
+        """Загрузка картинки: пост создается с обработанной картинкой"""
+        self.authorized_client.post(
+            reverse("posts:post_create"),
+            data={
+                "text": "Пост с картинкой",
+                "image": image_upload(
+                    "big.png", (settings.POSTS_IMAGE_MAX_EDGE * 2, 10), "PNG"
+                ),
+            },
+        )
+        post = Post.objects.get(text="Пост с картинкой")
+        self.assertTrue(post.image.name.endswith(".jpg"))
+        self.assertEqual(post.image.width, settings.POSTS_IMAGE_MAX_EDGE)
@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Comment, FeedEntry, Follow, Group, Post, UserStats
+from ..search import SearchResults
+
+User = get_user_model()
+
+RECORDS = [
+    {"model": "user", "username": "leo_tolstoy", "first_name": "Лев"},
+    {"model": "user", "username": "reader"},
+    {"model": "group", "slug": "cats", "title": "Котоводы"},
+    {"model": "follow", "user": "reader", "author": "leo_tolstoy"},
+    # Комментарий раньше своего поста: пачка пишется по зависимостям.
+    {"model": "comment", "post": 1, "author": "reader", "text": "Браво"},
+    {
+        "model": "post",
+        "id": 1,
+        "author": "leo_tolstoy",
+        "group": "cats",
+        "text": "Кот спит на окне",
+        "pub_date": "2020-05-01T10:00:00",
+    },
+    {"model": "post", "id": 2, "author": "reader", "text": "Второй пост"},
+    {"model": "post", "id": 3, "author": "nobody", "text": "Без автора"},
+]
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        source = tempfile.NamedTemporaryFile(
+            "w", suffix=".jsonl", delete=False, encoding="utf-8"
+        )
+        with source:
+            for record in RECORDS:
+                source.write(json.dumps(record, ensure_ascii=False) + "\n")
+            source.write("{не json\n")
+        self.path = source.name
+        self.addCleanup(os.remove, self.path)
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_yatube", self.path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_rows_and_dates(self):
+        """строки загружаются со своими датами, ошибочные пропускаются"""
+        out, err = self.run_import()
+        post = Post.objects.get(text="Кот спит на окне")
+        self.assertEqual(post.author.first_name, "Лев")
+        self.assertEqual(post.group.slug, "cats")
+        self.assertEqual(
+            post.pub_date, datetime(2020, 5, 1, 10, tzinfo=timezone.utc)
+        )
+        self.assertEqual(post.comments.get().text, "Браво")
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertTrue(Follow.objects.filter(user__username="reader"))
+        self.assertIn("Строка 8: KeyError('nobody')", err)
+        self.assertIn("Строка 9", err)
+        self.assertIn("Загружено 7, пропущено 2", out)
+
+    def test_derived_data_rebuilt(self):
+        """счетчики, поиск и ленты пересобраны после загрузки"""
+        self.run_import()
+        post = Post.objects.get(text="Кот спит на окне")
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.group.posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=post.author).followers_count, 1
+        )
+        self.assertEqual(SearchResults("окне").fetch(None, False, 10), [post])
+        self.assertEqual(
+            list(
+                FeedEntry.objects.filter(user__username="reader").values_list(
+                    "post_id", flat=True
+                )
+            ),
+            [post.pk],
+        )
+
+    def test_existing_rows_are_reused(self):
+        """повторная загрузка не дублирует пользователей и группы"""
+        author = User.objects.create_user(username="leo_tolstoy")
+        Group.objects.create(title="Старое", slug="cats", description="-")
+        out, _ = self.run_import("--batch-size", "2")
+        self.assertIn("строк/с", out)
+        self.assertEqual(
+            User.objects.filter(username="leo_tolstoy").count(), 1
+        )
+        self.assertEqual(Group.objects.get().title, "Старое")
+        self.assertEqual(
+            Post.objects.get(text="Кот спит на окне").author, author
+        )
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_only_new_images_reprocessed(self):
+        """после загрузки обрабатываются только картинки новых постов"""
+        author = User.objects.create_user(username="leo_tolstoy")
+        Post.objects.create(
+            author=author, text="Старый", image="posts/old.gif"
+        )
+        with open(self.path, "a", encoding="utf-8") as source:
+            source.write(
+                json.dumps(
+                    {
+                        "model": "post",
+                        "author": "leo_tolstoy",
+                        "text": "С картинкой",
+                        "image": "posts/new.gif",
+                    }
+                )
+                + "\n"
+            )
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ), mock.patch(
+            "posts.management.commands.reprocess_media.reprocess",
+            side_effect=lambda image: (image, 0, ""),
+        ) as reprocess:
+            self.run_import("--workers", "0")
+        reprocess.assert_called_once_with("posts/new.gif")
@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -33,3 +36,90 @@ class PostModelTest(TestCase):
         self.assertEqual(
             str(post), post.text[:15], "У постов неправильный __str__"
         )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+
+    def counters(self):
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        return (
+            self.author.stats.posts_count,
+            self.author.stats.followers_count,
+            self.reader.stats.following_count,
+            self.group.posts_count,
+        )
+
+    def test_counters_follow_saves_and_deletes(self):
+        """Счетчики меняются вместе с постами, комментариями и подписками"""
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text="Комментарий"
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(), (1, 1, 1, 1))
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.counters(), (1, 0, 0, 1))
+
+        post.group = None
+        post.save()
+        self.assertEqual(self.counters(), (1, 0, 0, 0))
+        post.delete()
+        self.assertEqual(self.counters(), (0, 0, 0, 0))
+
+    def test_stale_instance_keeps_counter(self):
+        """Сохранение устаревшего поста не затирает счетчик комментариев"""
+        post = Post.objects.create(author=self.author, text="Пост")
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(author=self.reader, post=post, text="Коммент")
+        stale.text = "Новый текст"
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_deleted_row_is_inserted_again(self):
+        """Сохранение удаленной строки вставляет ее заново"""
+        group = Group.objects.create(title="Группа", slug="deleted")
+        Group.objects.filter(pk=group.pk).delete()
+        group.save()
+        self.assertTrue(Group.objects.filter(pk=group.pk).exists())
+        group.delete()
+        group.save()
+        self.assertTrue(Group.objects.filter(pk=group.pk).exists())
+
+    def test_recount_repairs_drift(self):
+        """recount чинит разошедшиеся счетчики"""
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(author=self.reader, post=post, text="Коммент")
+        UserStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=7)
+
+        call_command("recount", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(), (1, 1, 1, 1))
@@ -1,9 +1,22 @@
+import hashlib
+import json
+import os
 import shutil
 import tempfile
+import threading
+from io import BytesIO, StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from django.utils import timezone
-from posts.models import Post
+from PIL import Image
+from posts import media, resize, thumbnails
+from posts.models import Post, ThumbnailTask
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
@@ -12,6 +25,14 @@ from django.urls import reverse
 from posts.models import Group
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
 
 User = get_user_model()
 
@@ -28,14 +49,7 @@ class TaskPagesTests(TestCase):
             description="Test group description",
         )
 
-        cls.small_gif = (
-            b"\x47\x49\x46\x38\x39\x61\x02\x00"
-            b"\x01\x00\x80\x00\x00\x00\x00\x00"
-            b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
-            b"\x00\x00\x00\x2C\x00\x00\x00\x00"
-            b"\x02\x00\x01\x00\x00\x02\x02\x0C"
-            b"\x0A\x00\x3B"
-        )
+        cls.small_gif = SMALL_GIF
         cls.uploaded = SimpleUploadedFile(
             name="small.gif", content=cls.small_gif, content_type="image/gif"
         )
@@ -114,8 +128,524 @@ class TaskPagesTests(TestCase):
             reverse("posts:post_create"), data=form_data, follow=True
         )
 
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
-                text="Тестовый текст", image="posts/small.gif"
+                text="Тестовый текст",
+                image=f"posts/{digest[:2]}/{digest[2:4]}/{digest}.gif",
             ).exists()
         )
+
+    def test_identical_uploads_share_file(self):
+        """одинаковые картинки хранятся одним файлом"""
+        post = Post.objects.create(
+            author=self.user,
+            text="Репост",
+            image=SimpleUploadedFile(
+                name="copy.GIF",
+                content=self.small_gif,
+                content_type="image/gif",
+            ),
+        )
+        self.assertEqual(post.image.name, self.post.image.name)
+        directory = os.path.dirname(post.image.path)
+        self.assertEqual(
+            os.listdir(directory), [os.path.basename(post.image.path)]
+        )
+
+    def test_file_released_with_last_post(self):
+        """файл удаляется вместе с последним постом со ссылкой на него"""
+        post = Post.objects.create(
+            author=self.user,
+            text="Репост",
+            image=SimpleUploadedFile(
+                name="copy.gif",
+                content=self.small_gif,
+                content_type="image/gif",
+            ),
+        )
+        path = post.image.path
+        os.utime(path, (0, 0))
+        variant = resize.resized(post.image.name, 480, 170)
+        post.delete()
+        self.assertFalse(media.release(post.image.name))
+        self.assertTrue(os.path.exists(path))
+        Post.objects.filter(image=post.image.name).delete()
+        self.assertTrue(media.release(post.image.name))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(variant.path))
+
+    def test_reuploaded_file_outlives_release(self):
+        """файл, только что загруженный снова, не удаляется до сохранения
+        нового поста"""
+        name = self.post.image.name
+        path = self.post.image.path
+        os.utime(path, (0, 0))
+        # Второй пост загрузил то же содержимое, но еще не сохранен.
+        self.assertEqual(
+            media.image_storage().save("posts/copy.gif", BytesIO(SMALL_GIF)),
+            name,
+        )
+        Post.objects.filter(image=name).delete()
+        self.assertFalse(media.release(name))
+        self.assertTrue(os.path.exists(path))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text="Тестовый текст",
+            image=SimpleUploadedFile(
+                name="queued.gif",
+                content=SMALL_GIF,
+                content_type="image/gif",
+            ),
+        )
+        cls.guest_client = Client()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_upload_enqueues_thumbnails(self):
+        """миниатюры и варианты ставятся в очередь при загрузке картинки"""
+        self.assertEqual(
+            list(
+                ThumbnailTask.objects.filter(
+                    image=self.post.image.name
+                ).values_list("geometry", "options")
+            ),
+            [("960x339", '{"crop": "center", "upscale": true}')]
+            + [
+                (size, '{"resize": true}')
+                for size in settings.POSTS_RESIZE_SIZES
+            ],
+        )
+
+    def test_queue_renders_variants(self):
+        """воркер очереди готовит варианты для srcset заранее"""
+        thumbnails.process(self.post.image.name)
+        for size in settings.POSTS_RESIZE_SIZES:
+            width, height = map(int, size.split("x"))
+            with self.subTest(size=size):
+                self.assertTrue(
+                    os.path.exists(
+                        resize.Variant(
+                            self.post.image.name, width, height
+                        ).path
+                    )
+                )
+        self.assertFalse(
+            ThumbnailTask.objects.filter(options='{"resize": true}').exists()
+        )
+
+    def test_placeholder_until_ready(self):
+        """пока миниатюры нет, страница отдает заглушку"""
+        response = self.guest_client.get(
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        )
+        self.assertContains(response, "data:image/svg+xml")
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, "cache"))
+        )
+        self.assertEqual(
+            ThumbnailTask.objects.filter(image=self.post.image.name).count(),
+            4,
+        )
+
+    def test_page_views_do_not_requeue(self):
+        """просмотр страницы не пишет в очередь уже поставленные задачи"""
+        ThumbnailTask.objects.update(
+            attempts=settings.POSTS_THUMBNAIL_ATTEMPTS
+        )
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        with mock.patch.object(thumbnails, "enqueue") as enqueue:
+            response = self.guest_client.get(url)
+        self.assertContains(response, "data:image/svg+xml")
+        enqueue.assert_not_called()
+
+    def test_queue_depth_command(self):
+        """команда показывает глубину очереди"""
+        out = StringIO()
+        call_command("thumbnail_queue", stdout=out)
+        self.assertIn("В очереди: 4", out.getvalue())
+
+    def test_claimed_task_is_not_taken_twice(self):
+        """задачу, взятую воркером, не берет другой воркер"""
+        ThumbnailTask.objects.update(started=timezone.now())
+        self.assertEqual(thumbnails.process(), 0)
+        self.assertEqual(ThumbnailTask.objects.count(), 4)
+        with self.settings(POSTS_THUMBNAIL_TIMEOUT=-1):
+            self.assertEqual(thumbnails.release_stale(), 4)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailPrefetchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.group = Group.objects.create(
+            title="Test group", slug="test_group_slug", description="-"
+        )
+        for cnt in range(10):
+            Post.objects.create(
+                author=cls.user,
+                text=f"Пост {cnt}",
+                group=cls.group,
+                image=SimpleUploadedFile(
+                    name=f"feed_{cnt}.gif",
+                    content=SMALL_GIF,
+                    content_type="image/gif",
+                ),
+            )
+        cls.guest_client = Client()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_page_thumbnails_are_fetched_at_once(self):
+        """миниатюры всей страницы читаются из kvstore одним запросом"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(
+                reverse("posts:group_list", kwargs={"slug": "test_group_slug"})
+            )
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        kvstore_queries = [
+            query
+            for query in context.captured_queries
+            if "thumbnail_kvstore" in query["sql"]
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ResizedImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text="Тестовый текст",
+            image=SimpleUploadedFile(
+                name="resized.gif",
+                content=SMALL_GIF,
+                content_type="image/gif",
+            ),
+        )
+        cls.url = reverse(
+            "posts:resized_image",
+            kwargs={"width": 480, "height": 170, "name": cls.post.image.name},
+        )
+        cls.guest_client = Client()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_resized_image(self):
+        """картинка отдается уменьшенной до размера из адреса"""
+        response = self.guest_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("Last-Modified", response)
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(image.size, (480, 170))
+
+    def test_not_modified(self):
+        """по If-None-Match с тем же ETag отдается 304"""
+        etag = self.guest_client.get(self.url)["ETag"]
+        response = self.guest_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_byte_range(self):
+        """Range отдает часть файла с кодом 206"""
+        full = b"".join(self.guest_client.get(self.url).streaming_content)
+        response = self.guest_client.get(self.url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{len(full)}")
+        self.assertEqual(b"".join(response.streaming_content), full[:10])
+        response = self.guest_client.get(
+            self.url, HTTP_RANGE=f"bytes={len(full)}-"
+        )
+        self.assertEqual(response.status_code, 416)
+
+    def test_placeholder_made_by_worker(self):
+        """крошечную заглушку считает воркер миниатюр, а не загрузка"""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.placeholder, "")
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertNotContains(response, "background: url(")
+        thumbnails.process(post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(post.placeholder.startswith("data:image/jpeg;base64,"))
+        self.assertLess(len(post.placeholder), 1000)
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertContains(response, post.placeholder)
+
+    def test_card_srcset(self):
+        """карточка отдает srcset из вариантов и ленивую загрузку"""
+        cache.clear()
+        response = self.guest_client.get(reverse("posts:index"))
+        self.assertContains(response, 'loading="lazy"')
+        for size in settings.POSTS_RESIZE_SIZES:
+            width, height = size.split("x")
+            url = reverse(
+                "posts:resized_image",
+                kwargs={
+                    "width": width,
+                    "height": height,
+                    "name": self.post.image.name,
+                },
+            )
+            self.assertContains(response, f"{url} {width}w")
+
+    def test_unknown_size_and_image(self):
+        """размер не из списка и чужой файл дают 404"""
+        urls = [
+            reverse(
+                "posts:resized_image",
+                kwargs={
+                    "width": 481,
+                    "height": 170,
+                    "name": self.post.image.name,
+                },
+            ),
+            reverse(
+                "posts:resized_image",
+                kwargs={"width": 480, "height": 170, "name": "posts/x.gif"},
+            ),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
+
+    def test_missing_source(self):
+        """удаленный с диска исходник дает 404, а не 500"""
+        buffer = BytesIO()
+        Image.new("RGB", (4, 4), "red").save(buffer, "PNG")
+        post = Post.objects.create(
+            author=self.user,
+            text="Без файла",
+            image=SimpleUploadedFile(
+                name="gone.png",
+                content=buffer.getvalue(),
+                content_type="image/png",
+            ),
+        )
+        os.remove(post.image.path)
+        response = self.guest_client.get(
+            reverse(
+                "posts:resized_image",
+                kwargs={"width": 480, "height": 170, "name": post.image.name},
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_concurrent_requests_resize_once(self):
+        """одновременные запросы одного варианта уменьшают картинку раз"""
+        barrier = threading.Barrier(4)
+
+        def request():
+            barrier.wait()
+            resize.resized(self.post.image.name, 960, 339)
+
+        with mock.patch.object(
+            resize, "render", wraps=resize.render
+        ) as render:
+            threads = [threading.Thread(target=request) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(render.call_count, 1)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0, POSTS_THUMBNAILS=[]
+)
+class ReprocessMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        for cnt in range(3):
+            Post.objects.create(
+                author=cls.user,
+                text=f"Пост {cnt}",
+                image=SimpleUploadedFile(
+                    name=f"batch_{cnt}.gif",
+                    content=SMALL_GIF,
+                    content_type="image/gif",
+                ),
+            )
+        cls.checkpoint = os.path.join(TEMP_MEDIA_ROOT, "checkpoint.json")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def tearDown(self):
+        # Варианты и контрольная точка лежат на диске, а не в базе.
+        shutil.rmtree(
+            os.path.join(TEMP_MEDIA_ROOT, "resized"), ignore_errors=True
+        )
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def reprocess(self, *args):
+        out = StringIO()
+        call_command(
+            "reprocess_media",
+            "--workers=0",
+            "--batch-size=2",
+            f"--checkpoint={self.checkpoint}",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_generates_all_variants(self):
+        """команда генерирует варианты всех размеров по разу на картинку"""
+        image = Post.objects.first().image.name
+        Post.objects.update(placeholder="")
+        output = self.reprocess()
+        self.assertIn("картинок 1, новых вариантов 4", output)
+        self.assertFalse(Post.objects.filter(placeholder="").exists())
+        self.assertIn("с ошибками 0", output)
+        for size in settings.POSTS_RESIZE_SIZES:
+            width, height = map(int, size.split("x"))
+            with self.subTest(size=size):
+                self.assertTrue(
+                    os.path.exists(resize.Variant(image, width, height).path)
+                )
+        self.assertIn("новых вариантов 0", self.reprocess("--restart"))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_from_checkpoint(self):
+        """прерванный проход продолжается после последней пачки"""
+        last = Post.objects.order_by("pk").last()
+        with open(self.checkpoint, "w") as checkpoint:
+            checkpoint.write(f'{{"after": {last.pk}}}')
+        output = self.reprocess()
+        self.assertIn(f"Продолжаем после поста {last.pk}", output)
+        self.assertIn("Готово: картинок 0", output)
+
+    def test_failures_keep_checkpoint(self):
+        """картинки с ошибками остаются в контрольной точке и повторяются"""
+        image = Post.objects.first().image.name
+        with mock.patch.object(
+            resize, "generate", side_effect=OSError("диск")
+        ):
+            output = self.reprocess("--restart")
+        self.assertIn("с ошибками 1", output)
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(json.load(checkpoint)["failed"], [image])
+        output = self.reprocess()
+        self.assertIn("Повторяем картинки с ошибками: 1", output)
+        self.assertIn("Готово: картинок 1", output)
+        self.assertIn("с ошибками 0", output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0, POSTS_THUMBNAILS=[]
+)
+class GcMediaTests(TestCase):
+    ORPHANS = (
+        "posts/00/00/" + "0" * 64 + ".gif",
+        "cache/00/00/" + "0" * 32 + ".jpg",
+        "resized/480x170/00/00/" + "0" * 64 + ".png",
+        "posts/00/00/.unfinished.tmp",
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text="Тестовый текст",
+            image=SimpleUploadedFile(
+                name="kept.gif", content=SMALL_GIF, content_type="image/gif"
+            ),
+        )
+        resize.generate(cls.post.image.name)
+        cls.kept = [cls.post.image.path] + [
+            resize.Variant(cls.post.image.name, *size).path
+            for size in ((480, 170), (960, 339), (1920, 678))
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.orphans = [
+            os.path.join(TEMP_MEDIA_ROOT, name) for name in self.ORPHANS
+        ]
+        for path in self.orphans:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(b"-")
+            os.utime(path, (0, 0))
+        for path in self.kept:
+            os.utime(path, (0, 0))
+
+    def gc_media(self, *args):
+        out = StringIO()
+        call_command("gc_media", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        """пробный прогон показывает сирот и ничего не удаляет"""
+        output = self.gc_media("--dry-run")
+        for name in self.ORPHANS:
+            self.assertIn(name, output)
+        self.assertIn("Сирот: 4", output)
+        for path in self.orphans + self.kept:
+            self.assertTrue(os.path.exists(path))
+
+    def test_removes_orphans(self):
+        """файлы без ссылок удаляются вместе с задачами очереди"""
+        ThumbnailTask.objects.create(image=self.ORPHANS[0], geometry="1x1")
+        self.gc_media()
+        for path in self.orphans:
+            self.assertFalse(os.path.exists(path))
+        for path in self.kept:
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(ThumbnailTask.objects.exists())
+
+    def test_quarantine(self):
+        """сироты переносятся в карантин с сохранением путей"""
+        quarantine = os.path.join(TEMP_MEDIA_ROOT, "quarantine")
+        self.gc_media(f"--quarantine={quarantine}")
+        for name, path in zip(self.ORPHANS, self.orphans):
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(os.path.exists(os.path.join(quarantine, name)))
+
+    def test_young_files_are_kept(self):
+        """свежие файлы не трогаются: их пост мог еще не сохраниться"""
+        os.utime(self.orphans[0])
+        output = self.gc_media()
+        self.assertTrue(os.path.exists(self.orphans[0]))
+        self.assertIn("Сирот: 3", output)
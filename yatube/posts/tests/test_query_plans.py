@@ -0,0 +1,206 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..paginators import CursorPaginator
+
+User = get_user_model()
+
+# «SCAN posts_post» без индекса - полный проход по таблице. Проход по
+# индексу («USING INDEX», «USING COVERING INDEX»), поиск FTS5 по своему
+# индексу («VIRTUAL TABLE INDEX») и подзапросы не в счет.
+FULL_SCAN = re.compile(
+    r"\bSCAN (?:TABLE )?(\w+)(?!.*\b(?:USING|VIRTUAL TABLE)\b.*\bINDEX\b)"
+)
+TEMP_SORT = "USE TEMP B-TREE"
+# Исключения - конкретные запросы, каждый с причиной.
+# Полный проход по таблице разрешен только этим запросам (SQL целиком):
+SCAN_ALLOWED = {
+    'SELECT "posts_group"."id", "posts_group"."title", '
+    '"posts_group"."slug", "posts_group"."description", '
+    '"posts_group"."posts_count" FROM "posts_group"': (
+        "выбор группы в PostForm: в списке все группы, без WHERE и LIMIT"
+    ),
+}
+# Сортировка в памяти - только запросам с этими фрагментами SQL:
+SORT_ALLOWED = {
+    'AS "head" FROM "posts_follow" WHERE "posts_follow"."user_id" = ': (
+        "«головы» merge-режима: сортируются подписки одного пользователя, "
+        "дата каждой головы - подзапрос по индексу post(author, -pub_date)"
+    ),
+    "FROM posts_post_search WHERE posts_post_search MATCH ": (
+        "поиск: ранг bm25 считается по найденным строкам, индекса по нему "
+        "в FTS5 нет"
+    ),
+}
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(sql):
+    """Шаги плана с полным проходом по таблице или сортировкой."""
+    tables = connection.introspection.table_names()
+    allow_scan = sql in SCAN_ALLOWED
+    allow_sort = any(fragment in sql for fragment in SORT_ALLOWED)
+    problems = []
+    for step in query_plan(sql):
+        match = FULL_SCAN.search(step)
+        if match and match.group(1) in tables and not allow_scan:
+            problems.append(step)
+        elif TEMP_SORT in step and not allow_sort:
+            problems.append(step)
+    return problems
+
+
+@override_settings(FEED_MODE="hybrid", FEED_CELEBRITY_THRESHOLD=2)
+class QueryPlanTests(TestCase):
+    """Каждый запрос страниц posts должен идти по индексу.
+
+    SQLite выбирает план по статистике, поэтому таблицы наполняются
+    так, чтобы проход по индексу был выгоднее полного прохода.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.celebrity = User.objects.create_user(username="celebrity")
+        # bulk_create в SQLite не проставляет id, поэтому перечитываем.
+        Group.objects.bulk_create(
+            Group(title=f"Группа {i}", slug=f"group_{i}", description="-")
+            for i in range(20)
+        )
+        groups = list(Group.objects.order_by("id"))
+        cls.group = groups[0]
+        User.objects.bulk_create(
+            User(username=f"user_{i}", password="!") for i in range(50)
+        )
+        users = list(User.objects.filter(username__startswith="user_"))
+        Post.objects.bulk_create(
+            Post(author=user, text="-", group=groups[i % 20])
+            for user in users
+            for i in range(20)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in users
+            for author in users[:5]
+            if user != author
+        )
+        for user in users[:5]:
+            Follow.objects.create(user=user, author=cls.celebrity)
+        for i in range(15):
+            Post.objects.create(
+                author=cls.author, text=f"Пост {i}", group=cls.group
+            )
+            Post.objects.create(author=cls.celebrity, text=f"Звезда {i}")
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.celebrity)
+        cls.post = Post.objects.filter(author=cls.author).first()
+        Comment.objects.bulk_create(
+            Comment(author=cls.reader, post=post, text="-")
+            for post in Post.objects.all()[:200]
+            for _ in range(3)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def assertIndexedQueries(self, client, url, method="get", data=None):
+        """Все SELECT запроса к url идут по индексам."""
+        with CaptureQueriesContext(connection) as context:
+            getattr(client, method)(url, data or {})
+        for query in context.captured_queries:
+            sql = query["sql"]
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(plan_problems(sql), [])
+
+    def cursor_for(self, queryset):
+        paginator = CursorPaginator(queryset, 10)
+        return paginator.encode_cursor("n", queryset[9])
+
+    def test_index(self):
+        """Планы запросов  |  главная страница"""
+        self.assertIndexedQueries(self.guest_client, reverse("posts:index"))
+        self.assertIndexedQueries(
+            self.guest_client, reverse("posts:index") + "?page=3"
+        )
+        cursor = self.cursor_for(Post.objects.all())
+        self.assertIndexedQueries(
+            self.guest_client, reverse("posts:index") + f"?cursor={cursor}"
+        )
+
+    def test_group_list(self):
+        """Планы запросов  |  страница группы"""
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        self.assertIndexedQueries(self.guest_client, url)
+        self.assertIndexedQueries(self.guest_client, url + "?page=2")
+        cursor = self.cursor_for(Post.objects.filter(group=self.group))
+        self.assertIndexedQueries(self.guest_client, url + f"?cursor={cursor}")
+
+    def test_profile(self):
+        """Планы запросов  |  профиль"""
+        url = reverse("posts:profile", kwargs={"username": "author"})
+        self.assertIndexedQueries(self.reader_client, url)
+        self.assertIndexedQueries(self.guest_client, url + "?page=2")
+        cursor = self.cursor_for(Post.objects.filter(author=self.author))
+        self.assertIndexedQueries(self.guest_client, url + f"?cursor={cursor}")
+
+    def test_post_detail(self):
+        """Планы запросов  |  страница поста"""
+        url = reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        self.assertIndexedQueries(self.reader_client, url)
+
+    def test_post_edit_and_comment(self):
+        """Планы запросов  |  редактирование и комментарий"""
+        self.assertIndexedQueries(
+            self.author_client,
+            reverse("posts:post_edit", kwargs={"post_id": self.post.id}),
+        )
+        self.assertIndexedQueries(
+            self.reader_client,
+            reverse("posts:add_comment", kwargs={"post_id": self.post.id}),
+            "post",
+            {"text": "Комментарий"},
+        )
+
+    def test_follow_index(self):
+        """Планы запросов  |  лента подписок во всех режимах"""
+        url = reverse("posts:follow_index")
+        for mode in ("push", "pull", "hybrid", "merge"):
+            with self.settings(FEED_MODE=mode):
+                for page in ("", "?page=2"):
+                    self.assertIndexedQueries(self.reader_client, url + page)
+
+    def test_search(self):
+        """Планы запросов  |  поиск"""
+        url = reverse("posts:search")
+        self.assertIndexedQueries(self.guest_client, url, data={"q": "пост"})
+
+    def test_follow_and_unfollow(self):
+        """Планы запросов  |  подписка и отписка"""
+        for name in ("posts:profile_unfollow", "posts:profile_follow"):
+            self.assertIndexedQueries(
+                self.reader_client,
+                reverse(name, kwargs={"username": "author"}),
+            )
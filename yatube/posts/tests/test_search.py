@@ -0,0 +1,124 @@
+from io import StringIO
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from ..admin import PostAdmin
+from ..models import Group, Post
+from ..search import TABLE
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="leo_tolstoy")
+        cls.group = Group.objects.create(
+            title="Котоводы", slug="cats", description="-"
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text="Кот спит на окне", group=cls.group
+        )
+        Post.objects.create(author=cls.user, text="Собака гуляет во дворе")
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        response = self.guest_client.get(
+            reverse("posts:search"), {"q": query}
+        )
+        return [post.text for post in response.context["page_obj"]]
+
+    def test_finds_text_author_and_group(self):
+        """поиск по словам текста, имени автора и названию группы"""
+        self.assertEqual(self.found("спит"), ["Кот спит на окне"])
+        self.assertEqual(self.found("котоводы"), ["Кот спит на окне"])
+        self.assertEqual(len(self.found("leo_tolstoy")), 2)
+        self.assertEqual(self.found("кот собака"), [])
+
+    def test_word_forms_by_prefix(self):
+        """длинные слова ищутся по префиксу: окн -> окне"""
+        self.assertEqual(self.found("окн"), ["Кот спит на окне"])
+
+    def test_ranked_by_relevance(self):
+        """пост, где слово встречается чаще, выше в выдаче"""
+        Post.objects.create(author=self.user, text="Кот, кот и еще раз кот")
+        self.assertEqual(self.found("кот")[0], "Кот, кот и еще раз кот")
+
+    def test_query_syntax_is_escaped(self):
+        """синтаксис FTS5 во вводе не ломает поиск"""
+        for query in ('"кот', "кот OR (", "NEAR(", "*", "кот:*"):
+            with self.subTest(query=query):
+                response = self.guest_client.get(
+                    reverse("posts:search"), {"q": query}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_index_follows_changes(self):
+        """правки поста, группы и удаление сразу видны в поиске"""
+        self.post.text = "Попугай дремлет на окне"
+        self.post.save()
+        self.assertEqual(self.found("спит"), [])
+        self.assertEqual(self.found("попугай"), ["Попугай дремлет на окне"])
+        self.group.title = "Птицеводы"
+        self.group.save()
+        self.assertEqual(self.found("котоводы"), [])
+        self.assertEqual(
+            self.found("птицеводы"), ["Попугай дремлет на окне"]
+        )
+        self.group.delete()
+        self.assertEqual(self.found("птицеводы"), [])
+        self.post.delete()
+        self.assertEqual(self.found("попугай"), [])
+
+    def test_empty_group_delete(self):
+        """удаление группы без постов не трогает индекс"""
+        group = Group.objects.create(title="Пустая", slug="empty")
+        group.delete()
+        self.assertEqual(self.found("кот"), ["Кот спит на окне"])
+
+    def test_keyset_pages(self):
+        """выдача листается курсором без повторов"""
+        for cnt in range(15):
+            Post.objects.create(author=self.user, text=f"Лиса номер {cnt}")
+        response = self.guest_client.get(
+            reverse("posts:search"), {"q": "лиса"}
+        )
+        first = list(response.context["page_obj"])
+        cursor = response.context["page_obj"].next_cursor
+        self.assertContains(response, "?q=%D0%BB%D0%B8%D1%81%D0%B0&amp;")
+        response = self.guest_client.get(
+            reverse("posts:search"), {"q": "лиса", "cursor": cursor}
+        )
+        second = list(response.context["page_obj"])
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 5)
+        self.assertFalse(set(first) & set(second))
+
+    def test_rebuild_command(self):
+        """команда пересобирает индекс с нуля"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+        self.assertEqual(self.found("кот"), [])
+        call_command("rebuild_search", stdout=StringIO())
+        self.assertEqual(self.found("кот"), ["Кот спит на окне"])
+
+    def test_admin_search(self):
+        """поиск в админке идет по тому же индексу"""
+        admin = PostAdmin(Post, AdminSite())
+        request = RequestFactory().get("/")
+        queryset, _ = admin.get_search_results(
+            request, Post.objects.all(), "собака"
+        )
+        self.assertEqual(
+            [post.text for post in queryset], ["Собака гуляет во дворе"]
+        )
@@ -1,7 +1,13 @@
-from posts.models import Post, Group, Follow
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from posts.models import FeedEntry, Post, Group, Follow
+from posts.timeline import MergeSource, PullSource, followers_changed
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.utils import timezone
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from http import HTTPStatus
 
@@ -109,3 +115,235 @@ class CacheTests(TestCase):
         response = self.author_client.get(reverse("posts:follow_index"))
         obj = len(response.context.get("page_obj").object_list)
         self.assertEqual(0, obj)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="Author")
+        cls.reader = User.objects.create_user(username="Reader")
+        cls.old_post = Post.objects.create(
+            author=cls.author, text="Пост до подписки"
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def timeline(self):
+        return list(
+            FeedEntry.objects.filter(user=self.reader).values_list(
+                "post_id", flat=True
+            )
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту старые посты автора"""
+        self.assertEqual(self.timeline(), [self.old_post.id])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков"""
+        post = Post.objects.create(author=self.author, text="Новый пост")
+        self.assertEqual(self.timeline(), [post.id, self.old_post.id])
+
+    def test_unfollow_and_delete_prune_timeline(self):
+        """Отписка и удаление поста чистят ленту"""
+        post = Post.objects.create(author=self.author, text="Новый пост")
+        post.delete()
+        self.assertEqual(self.timeline(), [self.old_post.id])
+        self.reader_client.get(
+            reverse("posts:profile_unfollow", args=[self.author.username])
+        )
+        self.assertEqual(self.timeline(), [])
+
+    @override_settings(FEED_TIMELINE_LENGTH=2)
+    def test_rebuild_command_caps_timeline(self):
+        """rebuild_timelines пересобирает ленту не длиннее лимита"""
+        posts = [
+            Post.objects.create(author=self.author, text=f"Пост {i}")
+            for i in range(3)
+        ]
+        FeedEntry.objects.all().delete()
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(self.timeline(), [posts[2].id, posts[1].id])
+
+    @override_settings(FEED_TIMELINE_LENGTH=2)
+    def test_backfill_trims_timeline(self):
+        """Подписка не раздувает ленту сверх лимита"""
+        other = User.objects.create_user(username="Other")
+        posts = [
+            Post.objects.create(author=other, text=f"Пост {i}")
+            for i in range(3)
+        ]
+        Follow.objects.create(user=self.reader, author=other)
+        self.assertEqual(self.timeline(), [posts[2].id, posts[1].id])
+
+    @override_settings(FEED_TIMELINE_LENGTH=2)
+    def test_fan_out_trims_timeline(self):
+        """Новые посты не раздувают ленту сверх лимита"""
+        posts = [
+            Post.objects.create(author=self.author, text=f"Пост {i}")
+            for i in range(6)
+        ]
+        self.assertEqual(self.timeline(), [posts[5].id, posts[4].id])
+
+    def test_migration_backfills_existing_follows(self):
+        """Миграция заполняет ленты по подпискам, сделанным до лент"""
+        FeedEntry.objects.all().delete()
+        migration = import_module("posts.migrations.0018_backfill_timelines")
+        migration.backfill_timelines(apps, None)
+        self.assertEqual(self.timeline(), [self.old_post.id])
+
+    def test_follow_index_reads_timeline(self):
+        """follow_index отдает посты из ленты"""
+        response = self.reader_client.get(reverse("posts:follow_index"))
+        self.assertEqual(
+            list(response.context["page_obj"]), [self.old_post]
+        )
+
+
+@override_settings(FEED_MODE="hybrid", FEED_CELEBRITY_THRESHOLD=2)
+class HybridTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username="Star")
+        cls.author = User.objects.create_user(username="Author")
+        cls.reader = User.objects.create_user(username="Reader")
+        cls.fan = User.objects.create_user(username="Fan")
+
+    def setUp(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.star)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_celebrity_posts_are_pulled_and_merged(self):
+        """Посты популярного автора читаются напрямую и сливаются с лентой"""
+        Follow.objects.create(user=self.fan, author=self.star)
+        first = Post.objects.create(author=self.star, text="Звезда 1")
+        second = Post.objects.create(author=self.author, text="Автор")
+        third = Post.objects.create(author=self.star, text="Звезда 2")
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.star).exists()
+        )
+
+        response = self.reader_client.get(reverse("posts:follow_index"))
+        self.assertEqual(
+            list(response.context["page_obj"]), [third, second, first]
+        )
+        self.assertEqual(response["X-Timeline-Served"], "pull=2, push=1")
+
+    def test_losing_followers_returns_author_to_push(self):
+        """Автор ниже порога снова раскладывается по лентам"""
+        Follow.objects.create(user=self.fan, author=self.star)
+        post = Post.objects.create(author=self.star, text="Звезда")
+        Follow.objects.filter(user=self.fan, author=self.star).delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.star.stats.followers_count, 1)
+
+    def test_counter_jump_crosses_threshold(self):
+        """скачок счетчика через порог тоже переводит автора"""
+        post = Post.objects.create(author=self.author, text="Автор")
+        followers_changed(self.author.id, 3, 2)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        followers_changed(self.author.id, 0, -3)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+
+    def test_merged_timeline_supports_cursor(self):
+        """Слитая лента листается курсором"""
+        Follow.objects.create(user=self.fan, author=self.star)
+        posts = [
+            Post.objects.create(author=author, text=f"Пост {i}")
+            for i in range(6)
+            for author in (self.star, self.author)
+        ]
+        url = reverse("posts:follow_index")
+        first = self.reader_client.get(url + "?cursor=").context["page_obj"]
+        second = self.reader_client.get(
+            url + "?cursor=" + first.next_cursor
+        ).context["page_obj"]
+        self.assertEqual(list(first) + list(second), posts[::-1])
+
+
+@override_settings(FEED_MODE="merge")
+class MergeTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username="Reader")
+        authors = [
+            User.objects.create_user(username=f"Author{i}") for i in range(4)
+        ]
+        for author in authors[:3]:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.posts = [
+            Post.objects.create(author=authors[i % 4], text=f"Пост {i}")
+            for i in range(20)
+        ]
+        cls.followed = [
+            post for post in cls.posts[::-1] if post.author != authors[3]
+        ]
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_merge_matches_subquery_order(self):
+        """k-way слияние дает тот же порядок, что и подзапрос"""
+        url = reverse("posts:follow_index")
+        first = self.reader_client.get(url + "?cursor=").context["page_obj"]
+        second = self.reader_client.get(
+            url + "?cursor=" + first.next_cursor
+        ).context["page_obj"]
+        self.assertEqual(list(first) + list(second), self.followed)
+        back = self.reader_client.get(
+            url + "?cursor=" + second.previous_cursor
+        ).context["page_obj"]
+        self.assertEqual(list(back), list(first))
+
+    def test_merge_numbered_pages(self):
+        """k-way слияние работает и с номерами страниц"""
+        response = self.reader_client.get(
+            reverse("posts:follow_index") + "?page=2"
+        )
+        self.assertEqual(
+            list(response.context["page_obj"]), self.followed[10:]
+        )
+
+    @override_settings(FEED_NUMBERED_PAGES=1)
+    def test_numbered_pages_end_with_cursor(self):
+        """за окном номерных страниц лента листается курсором"""
+        url = reverse("posts:follow_index")
+        first = self.reader_client.get(url).context["page_obj"]
+        self.assertFalse(first.has_next())
+        response = self.reader_client.get(url + "?page=2")
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        second = self.reader_client.get(
+            url + "?cursor=" + first.next_cursor
+        ).context["page_obj"]
+        self.assertEqual(list(first) + list(second), self.followed)
+
+    def test_merge_heads_with_tied_dates(self):
+        """при одинаковых датах срез голов не теряет авторов"""
+        reader = User.objects.create_user(username="Importer")
+        pub_date = timezone.now()
+        authors = []
+        for i in range(11):
+            author = User.objects.create_user(username=f"Tied{i}")
+            Follow.objects.create(user=reader, author=author)
+            Post.objects.create(author=author, text=f"Тот же миг {i}")
+            authors.append(author.id)
+        Post.objects.filter(author_id__in=authors).update(pub_date=pub_date)
+        for backwards in (False, True):
+            with self.subTest(backwards=backwards):
+                self.assertEqual(
+                    MergeSource(reader.id).fetch(None, backwards, 10),
+                    PullSource(authors).fetch(None, backwards, 10),
+                )
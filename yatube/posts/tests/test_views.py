@@ -1,9 +1,15 @@
+from core.templatetags.pagination import page_window
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from ..models import Post, Group
+from ..paginators import CachedCountPaginator, CursorPaginator
 from ..forms import PostForm
 
 User = get_user_model()
@@ -94,6 +100,15 @@ class TaskPagesTests(TestCase):
             "post_detail работает неправильно.",
         )
 
+    def test_post_detail_counts_only_author_posts(self):
+        """post_detail показывает число постов автора, а не всего сайта"""
+        other = User.objects.create_user(username="Other")
+        Post.objects.create(author=other, text="Чужой пост")
+        response = self.guest_client.get(
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id})
+        )
+        self.assertEqual(response.context.get("number_of_posts"), 1)
+
     def test_post_edit_has_form_with_post(self):
         """post_edit должен получать форму с постом, отобранным по id"""
         response = self.authorized_client.get(
@@ -172,3 +187,186 @@ class PaginatorViewsTest(TestCase):
             + "?page=2"
         )
         self.assertEqual(len(response.context["page_obj"]), 3, "Не три!")
+
+    def test_cursor_first_page_contains_ten_records(self):
+        """Paginator  |  cursor: первая страница по курсору - 10 постов"""
+        response = self.guest_client.get(reverse("posts:index") + "?cursor=")
+        page_obj = response.context["page_obj"]
+        self.assertEqual(len(page_obj), 10)
+        self.assertTrue(page_obj.has_next())
+        self.assertFalse(page_obj.has_previous())
+
+    def test_cursor_pages_match_numbered_pages(self):
+        """Paginator  |  cursor: вперед и назад те же посты, что и по номеру"""
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        first = self.guest_client.get(url + "?cursor=").context["page_obj"]
+        second = self.guest_client.get(
+            url + "?cursor=" + first.next_cursor
+        ).context["page_obj"]
+        numbered = self.guest_client.get(url + "?page=2").context["page_obj"]
+        self.assertEqual(list(second), list(numbered))
+        self.assertFalse(second.has_next())
+
+        back = self.guest_client.get(
+            url + "?cursor=" + second.previous_cursor
+        ).context["page_obj"]
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Paginator  |  cursor: битый курсор - первая страница"""
+        response = self.guest_client.get(
+            reverse("posts:index") + "?cursor=%%%"
+        )
+        self.assertEqual(len(response.context["page_obj"]), 10)
+
+
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="HasNoName")
+        for cnt in range(13):
+            Post.objects.create(author=cls.user, text=f"Пост {cnt}")
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(url)
+        return response, [
+            query["sql"]
+            for query in context.captured_queries
+            if "COUNT(" in query["sql"]
+        ]
+
+    def test_count_is_cached_and_invalidated(self):
+        """Paginator  |  COUNT(*) кэшируется и сбрасывается новым постом"""
+        url = reverse("posts:index") + "?page=2"
+        self.assertEqual(len(self.count_queries(url)[1]), 1)
+        self.assertEqual(self.count_queries(url)[1], [])
+
+        Post.objects.create(author=self.user, text="Новый пост")
+        response, counts = self.count_queries(url)
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.context["page_obj"].paginator.count, 14)
+
+    @override_settings(POSTS_COUNT_ESTIMATE_THRESHOLD=5)
+    def test_count_is_estimated_past_threshold(self):
+        """Paginator  |  после порога число постов оценивается"""
+        response = self.guest_client.get(reverse("posts:index"))
+        paginator = response.context["page_obj"].paginator
+        self.assertTrue(paginator.is_estimated)
+        self.assertEqual(paginator.count, Post.objects.latest("id").id)
+        self.assertNotContains(response, "Последняя")
+
+    @override_settings(POSTS_COUNT_ESTIMATE_THRESHOLD=5)
+    def test_cursor_past_estimate(self):
+        """Paginator  |  за оценкой - курсор, а не последняя страница"""
+        url = reverse("posts:index")
+        user = User.objects.create_user(username="Other")
+        Post.objects.create(author=user, text="Чужой пост")
+        # В выборке больше порога: число страниц упирается в порог.
+        posts = Post.objects.filter(author=self.user)
+        paginator = CachedCountPaginator(posts, 5)
+        last = paginator.get_page(1)
+        self.assertTrue(paginator.is_estimated)
+        self.assertFalse(last.has_next())
+        rest = CursorPaginator(posts, 5).get_page(last.next_cursor)
+        self.assertEqual(
+            list(last)
+            + list(rest)
+            + list(CursorPaginator(posts, 5).get_page(rest.next_cursor)),
+            list(posts),
+        )
+        self.assertEqual(
+            self.guest_client.get(url + "?page=99").status_code, 404
+        )
+        # После удалений MAX(id) завышает число: пустая страница - 404.
+        keep = list(Post.objects.values_list("pk", flat=True)[:6])
+        Post.objects.exclude(pk__in=keep).delete()
+        self.assertEqual(
+            self.guest_client.get(url + "?page=2").status_code, 404
+        )
+
+    def test_page_window(self):
+        """Paginator  |  в навигации только окно страниц"""
+        page_obj = Paginator(range(500), 10).get_page(25)
+        self.assertEqual(
+            page_window(page_obj),
+            [1, None, 23, 24, 25, 26, 27, None, 50],
+        )
+        self.assertEqual(
+            page_window(Paginator(range(30), 10).get_page(1)), [1, 2, 3]
+        )
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username="HasNoName", first_name="Лев", last_name="Толстой"
+        )
+        cls.group = Group.objects.create(
+            title="Test group", slug="test_group_slug", description="-"
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text="Тестовый текст", group=cls.group
+        )
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def get_profile(self):
+        return self.guest_client.get(
+            reverse("posts:profile", kwargs={"username": "HasNoName"})
+        )
+
+    def test_card_is_cached(self):
+        """Карточки  |  повторный рендер берется из кэша"""
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        self.guest_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text="Без сигналов")
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(url)
+        self.assertContains(response, "Тестовый текст")
+        # Автор нужен только для рендера карточки.
+        self.assertFalse(
+            any(
+                '"auth_user"' in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+
+    def test_card_renewed_on_post_edit(self):
+        """Карточки  |  правка поста дает новую карточку"""
+        self.get_profile()
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = "Исправленный текст"
+        post.save()
+        self.assertContains(self.get_profile(), "Исправленный текст")
+
+    def test_card_renewed_on_author_rename(self):
+        """Карточки  |  смена имени автора дает новую карточку"""
+        self.get_profile()
+        self.user.first_name = "Алексей"
+        self.user.save()
+        self.assertContains(self.get_profile(), "Алексей Толстой")
+
+    def test_login_keeps_cards(self):
+        """Карточки  |  вход автора не сбрасывает его карточки"""
+        Client().force_login(self.user)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).revision, 0)
+
+    def test_card_renewed_on_group_change(self):
+        """Карточки  |  правка и удаление группы дают новую карточку"""
+        self.get_profile()
+        self.group.slug = "renamed_slug"
+        self.group.save()
+        self.assertContains(self.get_profile(), "/group/renamed_slug/")
+        self.group.delete()
+        self.assertNotContains(self.get_profile(), "все записи группы")
@@ -0,0 +1,252 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+
+from . import counters, media, resize, versions
+from .models import Post, ThumbnailTask
+
+PLACEHOLDER = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">'
+    '<rect width="100%" height="100%" fill="#e9ecef"/></svg>'
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class PendingThumbnail(DummyImageFile):
+    """Заглушка того же размера на месте еще не готовой миниатюры."""
+
+    pending = True
+
+    @property
+    def url(self):
+        return "data:image/svg+xml," + quote(
+            PLACEHOLDER.format(self.x, self.y)
+        )
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который никогда не генерирует в запросе.
+
+    Готовая миниатюра берется из kvstore, а вместо недостающей
+    отдается PendingThumbnail, и генерация ставится в очередь, если
+    задачи на нее там еще нет.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError("falsey file_ argument in get_thumbnail()")
+        thumbnail = self.thumbnail_file(file_, geometry_string, options)
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        request(ImageFile(file_).name, geometry_string, options)
+        return PendingThumbnail(geometry_string)
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """Файл миниатюры; имя считается без обращений к хранилищам."""
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self.full_options(source, options)
+        )
+        return ImageFile(name, default.storage)
+
+    def full_options(self, source, options):
+        """Опции с умолчаниями, как их дополняет ThumbnailBackend."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+
+def prefetch(posts):
+    """Контекст, в котором миниатюры POSTS_THUMBNAILS для posts
+    читаются из kvstore одним пакетом, а не по запросу на пост."""
+    if not hasattr(default.kvstore, "prefetch"):
+        return nullcontext()
+    backend = DeferredThumbnailBackend()
+    return default.kvstore.prefetch(
+        backend.thumbnail_file(post.image, geometry, options)
+        for post in posts
+        if post.image
+        for geometry, options in settings.POSTS_THUMBNAILS
+    )
+
+
+def enqueue(image, geometry, options):
+    """Ставит миниатюру в очередь; повторная постановка ничего не меняет."""
+    ThumbnailTask.objects.bulk_create(
+        [
+            ThumbnailTask(
+                image=image,
+                geometry=geometry,
+                options=json.dumps(options, sort_keys=True),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(lambda: submit(image))
+
+
+def request(image, geometry, options):
+    """enqueue для страниц: просмотр ничего не пишет и не будит воркеров,
+    если задача уже есть - ждет очереди или исчерпала попытки."""
+    exists = ThumbnailTask.objects.filter(
+        image=image,
+        geometry=geometry,
+        options=json.dumps(options, sort_keys=True),
+    ).exists()
+    if not exists:
+        enqueue(image, geometry, options)
+
+
+def enqueue_post(post):
+    """Ставит в очередь все миниатюры из POSTS_THUMBNAILS и варианты
+    POSTS_RESIZE_SIZES для srcset картинки поста."""
+    name = post.image.name
+    for geometry, options in settings.POSTS_THUMBNAILS:
+        enqueue(name, geometry, options)
+    for size in settings.POSTS_RESIZE_SIZES:
+        width, height = (int(side) for side in size.split("x"))
+        if resize.allowed(name, width, height):
+            enqueue(name, size, resize.TASK_OPTIONS)
+
+
+def submit(image):
+    global _executor
+    workers = settings.POSTS_THUMBNAIL_WORKERS
+    if not workers:
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="thumbnails"
+        )
+    _executor.submit(work, image)
+
+
+def work(image):
+    try:
+        process(image)
+    except Exception:
+        logger.exception("thumbnails for %s failed", image)
+    finally:
+        connection.close()
+
+
+def pending():
+    return ThumbnailTask.objects.filter(
+        attempts__lt=settings.POSTS_THUMBNAIL_ATTEMPTS
+    )
+
+
+def failed():
+    return ThumbnailTask.objects.filter(
+        attempts__gte=settings.POSTS_THUMBNAIL_ATTEMPTS
+    )
+
+
+def release_stale():
+    """Возвращает в очередь задачи воркеров, которые не доработали."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.POSTS_THUMBNAIL_TIMEOUT
+    )
+    return ThumbnailTask.objects.filter(started__lt=deadline).update(
+        started=None
+    )
+
+
+def claim(tasks):
+    """Задачи, которые удалось забрать раньше других воркеров."""
+    for task in list(tasks.filter(started=None)):
+        claimed = ThumbnailTask.objects.filter(
+            pk=task.pk, started=None
+        ).update(started=timezone.now())
+        if claimed:
+            yield task
+
+
+def run(task):
+    options = json.loads(task.options)
+    variant = options == resize.TASK_OPTIONS
+    try:
+        if variant:
+            width, height = (int(side) for side in task.geometry.split("x"))
+            resize.resized(task.image, width, height)
+        else:
+            ThumbnailBackend().get_thumbnail(
+                media.image_file(task.image), task.geometry, **options
+            )
+    except Exception:
+        logger.exception(
+            "thumbnail %s of %s failed", task.geometry, task.image
+        )
+        ThumbnailTask.objects.filter(pk=task.pk).update(
+            started=None, attempts=F("attempts") + 1
+        )
+        return False
+    task.delete()
+    if not variant:
+        # Адреса srcset от готовности варианта не зависят.
+        counters.revise(Post.objects.filter(image=task.image))
+    return True
+
+
+def generate(image):
+    """Сразу генерирует недостающие миниатюры POSTS_THUMBNAILS картинки,
+    минуя очередь. Возвращает число новых миниатюр."""
+    source = media.image_file(image)
+    deferred = DeferredThumbnailBackend()
+    geometries = []
+    for geometry, options in settings.POSTS_THUMBNAILS:
+        thumbnail = deferred.thumbnail_file(source, geometry, options)
+        if default.kvstore.get(thumbnail):
+            continue
+        ThumbnailBackend().get_thumbnail(source, geometry, **options)
+        geometries.append(geometry)
+    if geometries:
+        ThumbnailTask.objects.filter(
+            image=image, geometry__in=geometries
+        ).delete()
+        counters.revise(Post.objects.filter(image=image))
+    return len(geometries)
+
+
+def process(image=None):
+    """Генерирует миниатюры из очереди и возвращает число готовых.
+
+    Заодно считает заглушки (media.fill_placeholders) картинкам из
+    очереди. Карточки постов с готовыми миниатюрами и заглушками получают
+    новую revision, чтобы вместо серого фона показалась картинка.
+    """
+    tasks = pending()
+    if image is not None:
+        tasks = tasks.filter(image=image)
+    done, images = 0, set()
+    for task in claim(tasks):
+        done += run(task)
+        images.add(task.image)
+    filled = sum(media.fill_placeholders(name) for name in images)
+    if done or filled:
+        versions.bump(versions.FEED)
+    return done
@@ -0,0 +1,375 @@
+import heapq
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import FeedEntry, Follow, Post, UserStats
+from .paginators import fetch, reverse_ordering, seek
+
+BATCH_SIZE = 500
+
+PUSH = "push"
+PULL = "pull"
+HYBRID = "hybrid"
+MERGE = "merge"
+
+POST_ORDERING = ("-pub_date", "-id")
+ENTRY_ORDERING = ("-pub_date", "-post_id")
+
+NEVER = datetime(9999, 12, 31, tzinfo=timezone.utc)
+
+logger = logging.getLogger(__name__)
+
+
+def timeline_length():
+    return settings.FEED_TIMELINE_LENGTH
+
+
+def pushes():
+    """Пишутся ли материализованные ленты в текущем режиме."""
+    return settings.FEED_MODE in (PUSH, HYBRID)
+
+
+def is_celebrity(author_id):
+    """В гибридном режиме посты популярных авторов не раскладываются."""
+    if settings.FEED_MODE != HYBRID:
+        return False
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.FEED_CELEBRITY_THRESHOLD,
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам всех подписчиков автора."""
+    if not pushes() or is_celebrity(post.author_id):
+        return
+    followers = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list("user_id", flat=True)
+        .iterator()
+    )
+    # Пачками: каждую ленту пачки сразу обрезаем до FEED_TIMELINE_LENGTH.
+    while True:
+        user_ids = list(islice(followers, BATCH_SIZE))
+        if not user_ids:
+            return
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True,
+        )
+        trim(user_ids)
+
+
+def touch(post):
+    """Переносит пост в лентах, если у него сменилась дата публикации."""
+    FeedEntry.objects.filter(post=post).exclude(
+        pub_date=post.pub_date
+    ).update(pub_date=post.pub_date)
+
+
+def backfill(user_id, author_id):
+    """После подписки добавляет в ленту последние посты автора."""
+    if not pushes() or is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        "id", "pub_date"
+    )[: timeline_length()]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def prune(user_id, author_id):
+    """После отписки убирает из ленты посты автора."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def followers_changed(author_id, followers_count, delta):
+    """Переводит автора между push- и pull-путем на пороге популярности.
+
+    Ставший популярным автор убирается из всех лент (его посты теперь
+    читаются напрямую), а переставший - раскладывается подписчикам.
+    Срабатывает на переходе через порог, а не на точном равенстве, так
+    что скачок счетчика порог не перешагнет; разошедшиеся со счетчиком
+    ленты приводит в порядок rebuild_timelines.
+    """
+    if settings.FEED_MODE != HYBRID:
+        return
+    threshold = settings.FEED_CELEBRITY_THRESHOLD
+    previous = followers_count - delta
+    if previous < threshold <= followers_count:
+        FeedEntry.objects.filter(post__author_id=author_id).delete()
+    elif followers_count < threshold <= previous:
+        followers = Follow.objects.filter(author_id=author_id).values_list(
+            "user_id", flat=True
+        )
+        for user_id in followers.iterator():
+            backfill(user_id, author_id)
+
+
+def trim(user_ids):
+    """Обрезает ленты до FEED_TIMELINE_LENGTH записей."""
+    limit = timeline_length()
+    boundary = FeedEntry.objects.filter(user_id=OuterRef("user_id")).values(
+        "pub_date"
+    )[limit - 1: limit]
+    FeedEntry.objects.filter(
+        user_id__in=user_ids, pub_date__lt=Subquery(boundary)
+    ).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    if not pushes():
+        return
+    posts = Post.objects.filter(author__following__user_id=user_id)
+    if settings.FEED_MODE == HYBRID:
+        posts = posts.exclude(
+            author__stats__followers_count__gte=(
+                settings.FEED_CELEBRITY_THRESHOLD
+            )
+        )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.values_list("id", "pub_date")[
+                : timeline_length()
+            ]
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class PushSource:
+    """Посты из материализованной ленты пользователя."""
+
+    name = PUSH
+
+    def __init__(self, user_id):
+        self.queryset = FeedEntry.objects.select_related(
+            "post__author", "post__group"
+        ).filter(user_id=user_id)
+
+    def count(self):
+        return self.queryset.count()
+
+    def fetch(self, values, reverse, limit):
+        entries = fetch(self.queryset, ENTRY_ORDERING, values, reverse, limit)
+        return [entry.post for entry in entries]
+
+
+class PullSource:
+    """Посты авторов, читаемые напрямую в момент запроса."""
+
+    name = PULL
+
+    def __init__(self, authors):
+        self.queryset = Post.objects.select_related("author", "group").filter(
+            author_id__in=authors
+        )
+
+    def count(self):
+        return self.queryset.count()
+
+    def fetch(self, values, reverse, limit):
+        return fetch(self.queryset, POST_ORDERING, values, reverse, limit)
+
+
+class _Stream:
+    """Поток постов одного автора внутри k-way слияния."""
+
+    def __init__(self, author_id, head, after, reverse):
+        self.author_id = author_id
+        self.after = after
+        self.reverse = reverse
+        self.rows = []
+        self.exhausted = False
+        # Пока посты не прочитаны, известна только дата первого из них:
+        # такой ключ идет раньше любого поста с той же датой.
+        self.key = (head, float("-inf") if reverse else float("inf"))
+
+    def __lt__(self, other):
+        if self.reverse:
+            return self.key < other.key
+        return self.key > other.key
+
+
+class MergeSource:
+    """Лента подписок как k-way слияние потоков постов каждого автора.
+
+    Одним запросом по индексу Post(author, -pub_date) берется дата
+    самого свежего поста каждого автора, дальше куча по этим датам
+    решает, у кого дочитать посты. У автора читается не больше постов,
+    чем осталось до конца страницы, поэтому базе не приходится
+    сортировать все посты всех подписок.
+    """
+
+    name = MERGE
+
+    def __init__(self, user_id):
+        self.follows = Follow.objects.filter(user_id=user_id)
+        self.queryset = Post.objects.select_related("author", "group")
+
+    def count(self):
+        return Post.objects.filter(
+            author_id__in=self.follows.values("author_id")
+        ).count()
+
+    def heads(self, values, reverse, limit):
+        """Даты первых постов авторов, которые могут попасть на страницу.
+
+        Автор, чей первый пост идет после limit первых постов других
+        авторов, на страницу не попадет, поэтому база отдает только
+        limit самых свежих «голов».
+        """
+        posts = Post.objects.filter(author_id=OuterRef("author_id"))
+        if values is not None:
+            posts = posts.filter(seek(POST_ORDERING, values, reverse))
+        ordering = POST_ORDERING
+        if reverse:
+            ordering = reverse_ordering(ordering)
+        posts = posts.order_by(*ordering)
+        head = Subquery(posts.values("pub_date")[:1])
+        # Головы с одной датой упорядочиваются по id, как посты в
+        # POST_ORDERING, иначе срез мог бы отрезать нужного автора.
+        head_id = Subquery(posts.values("id")[:1])
+        order = ("-head", "-head_id")
+        if reverse:
+            # По возрастанию SQLite ставит NULL первыми - уводим их в конец.
+            head, order = Coalesce(head, Value(NEVER)), ("head", "head_id")
+        heads = self.follows.annotate(head=head, head_id=head_id).order_by(
+            *order
+        )
+        return [
+            (author_id, head)
+            for author_id, head in heads.values_list("author_id", "head")[
+                :limit
+            ]
+            if head is not None and head != NEVER
+        ]
+
+    def fetch(self, values, reverse, limit):
+        heap = [
+            _Stream(author_id, head, values, reverse)
+            for author_id, head in self.heads(values, reverse, limit)
+        ]
+        heapq.heapify(heap)
+        result = []
+        while heap and (limit is None or len(result) < limit):
+            stream = heapq.heappop(heap)
+            if not stream.rows:
+                if stream.exhausted:
+                    continue
+                need = None if limit is None else limit - len(result)
+                stream.rows = fetch(
+                    self.queryset.filter(author_id=stream.author_id),
+                    POST_ORDERING,
+                    stream.after,
+                    reverse,
+                    need,
+                )[::-1]
+                stream.exhausted = need is None or len(stream.rows) < need
+                if not stream.rows:
+                    continue
+            else:
+                post = stream.rows.pop()
+                result.append(post)
+                stream.after = [post.pub_date, post.id]
+            if stream.rows:
+                stream.key = (stream.rows[-1].pub_date, stream.rows[-1].id)
+            else:
+                stream.key = tuple(stream.after)
+            heapq.heappush(heap, stream)
+        return result
+
+
+class Timeline:
+    """Лента подписок, слитая из нескольких источников по (pub_date, id).
+
+    Поддерживает и Paginator (count() и срезы), и CursorPaginator
+    (fetch()). В served копится, сколько постов отдал каждый источник.
+    """
+
+    model = Post
+    ordered = True
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.served = Counter()
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def merge(self, values, reverse, limit):
+        streams = [
+            [(post.pub_date, post.id, source.name, post) for post in rows]
+            for source, rows in (
+                (source, source.fetch(values, reverse, limit))
+                for source in self.sources
+            )
+        ]
+        merged, last_id = [], None
+        for _, post_id, name, post in heapq.merge(
+            *streams, key=lambda item: item[:2], reverse=not reverse
+        ):
+            if post_id == last_id:
+                continue
+            last_id = post_id
+            merged.append((name, post))
+            if limit is not None and len(merged) == limit:
+                break
+        return merged
+
+    def serve(self, items):
+        served = Counter(name for name, _ in items)
+        self.served.update(served)
+        logger.debug("follow timeline served %s", dict(served))
+        return [post for _, post in items]
+
+    def fetch(self, values, reverse, limit):
+        return self.serve(self.merge(values, reverse, limit))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("Timeline supports only slicing")
+        return self.serve(self.merge(None, False, index.stop)[index])
+
+
+def follow_timeline(user):
+    """Лента подписок пользователя в режиме settings.FEED_MODE."""
+    if settings.FEED_MODE == PULL:
+        authors = Follow.objects.filter(user=user).values("author_id")
+        return Timeline([PullSource(authors)])
+    if settings.FEED_MODE == MERGE:
+        return Timeline([MergeSource(user.id)])
+    sources = [PushSource(user.id)]
+    if settings.FEED_MODE == HYBRID:
+        celebrities = list(
+            Follow.objects.filter(
+                user=user,
+                author__stats__followers_count__gte=(
+                    settings.FEED_CELEBRITY_THRESHOLD
+                ),
+            ).values_list("author_id", flat=True)
+        )
+        if celebrities:
+            sources.append(PullSource(celebrities))
+    return Timeline(sources)
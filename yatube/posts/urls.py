@@ -2,20 +2,49 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
 
-from . import views
+from . import api, feeds, views
 
 app_name = "posts"
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("rss/", feeds.PostsFeed(), name="feed_rss"),
+    path("atom/", feeds.AtomPostsFeed(), name="feed_atom"),
     path("group/<slug:slug>/", views.group_list, name="group_list"),
+    path(
+        "group/<slug:slug>/rss/",
+        feeds.GroupPostsFeed(),
+        name="group_feed_rss",
+    ),
+    path(
+        "group/<slug:slug>/atom/",
+        feeds.AtomGroupPostsFeed(),
+        name="group_feed_atom",
+    ),
     path("profile/<str:username>/", views.profile, name="profile"),
+    path(
+        "profile/<str:username>/rss/",
+        feeds.AuthorPostsFeed(),
+        name="profile_feed_rss",
+    ),
+    path(
+        "profile/<str:username>/atom/",
+        feeds.AtomAuthorPostsFeed(),
+        name="profile_feed_atom",
+    ),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path("create/", views.post_create, name="post_create"),
     path(
         "posts/<int:post_id>/comment/", views.add_comment, name="add_comment"
     ),
+    path("search/", views.search, name="search"),
+    path("export/", views.export_account, name="export_account"),
     path("follow/", views.follow_index, name="follow_index"),
     path(
         "profile/<str:username>/follow/",
@@ -27,6 +56,29 @@ urlpatterns = [
         views.profile_unfollow,
         name="profile_unfollow",
     ),
+    path("api/v1/posts/", api.index, name="api_index"),
+    path("api/v1/posts/bulk/", api.posts_bulk, name="api_posts_bulk"),
+    path(
+        "api/v1/posts/<int:post_id>/",
+        api.post_detail,
+        name="api_post_detail",
+    ),
+    path(
+        "api/v1/groups/<slug:slug>/posts/",
+        api.group_posts,
+        name="api_group_posts",
+    ),
+    path(
+        "api/v1/profiles/<str:username>/posts/",
+        api.profile_posts,
+        name="api_profile_posts",
+    ),
+    path(
+        settings.MEDIA_URL.lstrip("/") + "r/<int:width>x<int:height>/"
+        "<path:name>",
+        views.resized_image,
+        name="resized_image",
+    ),
 ]
 
 if settings.DEBUG:
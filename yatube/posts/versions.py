@@ -0,0 +1,27 @@
+import time
+
+from django.core.cache import cache
+
+COUNTS = "posts:count_version"
+FEED = "posts:feed_version"
+# Имена пользователей: выводятся у комментариев, поэтому входят в ETag
+# страницы поста.
+NAMES = "posts:names_version"
+
+
+def fresh():
+    """Начальная версия: больше любой, выданной до вытеснения ключа."""
+    return int(time.time() * 1000)
+
+
+def get(key):
+    """Текущая версия данных key; ее кладут в ключи кэша."""
+    return cache.get_or_set(key, fresh, None)
+
+
+def bump(key):
+    """Делает все ключи кэша со старой версией недостижимыми."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, fresh(), None)
@@ -1,36 +1,57 @@
-from django.core.paginator import Paginator
 from django.shortcuts import (
     render,
     get_object_or_404,
     redirect,
 )
+from django.http import Http404, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from PIL import Image
 from pytz import timezone
 from .models import Post, Group, User, Comment, Follow
+from .counters import stats_for
+from . import export, resize, versions
+from .conditional import (
+    group_version,
+    page_condition,
+    post_version,
+    profile_version,
+)
 from .forms import PostForm, CommentForm
+from .paginators import (
+    COMMENT_ORDERING,
+    POSTS_PER_PAGE,
+    CursorPaginator,
+    paginate,
+)
+from .search import SearchPaginator, SearchResults
+from .timeline import follow_timeline
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.utils.http import urlencode
+from core.http import file_response
 
 
 def index(request):
     post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-
-    page_number = request.GET.get("page")
-
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post_list)
     context = {
         "page_obj": page_obj,
+        "feed_version": versions.get(versions.FEED),
+        # Ключ кэша - номер или разобранный курсор, а не строка из URL:
+        # мусорные курсоры не плодят записей в кэше.
+        "page_key": page_obj.number or page_obj.cursor,
+        "cache_timeout": settings.POSTS_INDEX_CACHE_TIMEOUT,
     }
     return render(request, "posts/index.html", context)
 
 
+@page_condition(group_version)
 def group_list(request, slug):
     template = "posts/group_list.html"
     group = get_object_or_404(Group, slug=slug)
     post_list = Post.objects.filter(group=group)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post_list, count=group.posts_count)
     context = {
         "page_obj": page_obj,
         "text": slug,
@@ -39,14 +60,16 @@ def group_list(request, slug):
     return render(request, template, context)
 
 
+@page_condition(profile_version)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    stats = stats_for(user)
     posts = Post.objects.select_related("author", "group").filter(
         author__username=user
     )
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts, count=stats.posts_count)
     following = False
     if (
         request.user.get_username() != ""
@@ -55,31 +78,73 @@ def profile(request, username):
         following = True
     context = {
         "author": user,
+        "stats": stats,
         "page_obj": page_obj,
         "following": following,
     }
     return render(request, "posts/profile.html", context)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page_obj = None
+    if query:
+        page_obj = SearchPaginator(
+            SearchResults(query), POSTS_PER_PAGE
+        ).get_page(request.GET.get("cursor"))
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+        "query_prefix": urlencode({"q": query}) + "&",
+    }
+    return render(request, "posts/search.html", context)
+
+
+def comment_page(post_id, cursor):
+    """Страница комментариев поста, новые сверху, по курсору
+    (created, id) - по индексу comment_post_created_idx."""
     comments = Comment.objects.select_related("author").filter(
-        post__id=post_id
+        post_id=post_id
     )
-    number_of_posts = Post.objects.count()
+    return CursorPaginator(
+        comments,
+        settings.POSTS_COMMENTS_PER_PAGE,
+        ordering=COMMENT_ORDERING,
+    ).get_page(cursor)
+
+
+@page_condition(post_version)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), id=post_id
+    )
+    number_of_posts = stats_for(post.author).posts_count
     form = CommentForm(request.POST or None)
     context = {
         "post": post,
+        "post_id": post.pk,
         "number_of_posts": number_of_posts,
         "form": form,
-        "comments": comments,
+        "comments": comment_page(post.pk, request.GET.get("comments")),
     }
     return render(request, "posts/post_detail.html", context)
 
 
+@page_condition(post_version)
+def post_comments(request, post_id):
+    """Следующая пачка комментариев HTML-фрагментом для «Показать еще»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        "post_id": post_id,
+        "comments": comment_page(post_id, request.GET.get("cursor")),
+    }
+    return render(request, "posts/includes/comments.html", context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
 
     if not form.is_valid():
         context = {"form": form}
@@ -137,25 +202,18 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    user = request.user
-
-    authors = (
-        Follow.objects.select_related("author")
-        .filter(user=user)
-        .values_list("author")
-    )
-
-    post_list = Post.objects.select_related("author", "group").filter(
-        author_id__in=authors
+    feed = follow_timeline(request.user)
+    page_obj = paginate(
+        request, feed, max_pages=settings.FEED_NUMBERED_PAGES
     )
-
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
     context = {
         "page_obj": page_obj,
     }
-    return render(request, "posts/follow.html", context)
+    response = render(request, "posts/follow.html", context)
+    response["X-Timeline-Served"] = ", ".join(
+        f"{name}={count}" for name, count in sorted(feed.served.items())
+    )
+    return response
 
 
 @login_required
@@ -174,3 +232,36 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=user, author=author).delete()
     return redirect("posts:profile", username=author.get_username())
+
+
+@login_required
+@require_safe
+def export_account(request):
+    response = StreamingHttpResponse(
+        export.archive(request.user), content_type="application/zip"
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="yatube-{request.user.pk}.zip"'
+    )
+    return response
+
+
+@require_safe
+def resized_image(request, width, height, name):
+    if (
+        not resize.allowed(name, width, height)
+        or not Post.objects.filter(image=name).exists()
+    ):
+        raise Http404
+    try:
+        variant = resize.resized(name, width, height)
+    except (OSError, Image.DecompressionBombError):
+        # Исходника нет на диске, или это не картинка, или она огромна.
+        raise Http404
+    return file_response(
+        request,
+        variant.path,
+        variant.content_type,
+        variant.etag,
+        max_age=settings.POSTS_RESIZE_MAX_AGE,
+    )
@@ -155,3 +155,79 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
+
+# Сколько последних постов хранится в ленте подписок одного пользователя
+FEED_TIMELINE_LENGTH = 1000
+
+# Как собирается лента подписок: "push" - из материализованных лент,
+# "pull" - запросом по подпискам, "hybrid" - push для обычных авторов
+# и pull для авторов, у которых не меньше FEED_CELEBRITY_THRESHOLD
+# подписчиков
+FEED_MODE = "hybrid"
+FEED_CELEBRITY_THRESHOLD = 10000
+# Сколько первых страниц ленты подписок доступно по номеру: номерная
+# страница сливает все источники с самого начала, дальше - курсор
+FEED_NUMBERED_PAGES = 20
+
+# Сколько секунд кэшируется число постов в ленте для паджинатора
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 5
+# Дальше этого числа посты не пересчитываются, число страниц оценивается
+POSTS_COUNT_ESTIMATE_THRESHOLD = 10000
+
+# Сколько секунд живет кэш главной страницы. Новые, измененные и
+# удаленные посты сбрасывают его сразу, срок только ограничивает
+# устаревание после правок авторов и групп
+POSTS_INDEX_CACHE_TIMEOUT = 60
+
+# Сколько секунд хранится отрендеренная карточка поста. Ключ включает
+# revision поста, так что срок ограничивает только размер кэша
+POSTS_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюры генерируются в фоне: в запросе отдается готовая или заглушка
+THUMBNAIL_BACKEND = "posts.thumbnails.DeferredThumbnailBackend"
+# Миниатюры, которые готовятся сразу после загрузки картинки поста:
+# (геометрия, опции) в том виде, как они записаны в {% thumbnail %}
+POSTS_THUMBNAILS = [("960x339", {"crop": "center", "upscale": True})]
+# Потоков генерации в веб-процессе; 0 - очередь разбирает только
+# manage.py thumbnail_queue --run
+POSTS_THUMBNAIL_WORKERS = 2
+# Сколько раз пробовать сгенерировать миниатюру, прежде чем сдаться
+POSTS_THUMBNAIL_ATTEMPTS = 3
+# Через сколько секунд задача упавшего воркера возвращается в очередь
+POSTS_THUMBNAIL_TIMEOUT = 60 * 10
+# Хранилище ключей sorl-thumbnail с пакетной подгрузкой для страниц лент
+THUMBNAIL_KVSTORE = "posts.kvstore.KVStore"
+
+# Загрузка картинок постов: больше этих размеров картинка отклоняется
+# по заголовку, не декодируясь
+POSTS_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+# До какой длинной стороны уменьшаются картинки и с каким качеством
+# перекодируются в JPEG
+POSTS_IMAGE_MAX_EDGE = 1920
+POSTS_IMAGE_QUALITY = 85
+# Картинки моложе стольких секунд не удаляются ни при удалении поста, ни
+# gc_media: пост с той же, только что загруженной картинкой мог еще не
+# сохраниться. Оставленные так картинки (и все, что не удалилось из-за
+# сбоя) убирает только gc_media, поэтому его нужно запускать регулярно,
+# например раз в сутки по cron
+POSTS_MEDIA_MIN_AGE = 60 * 60
+
+# Размеры, до которых /media/r/<w>x<h>/<картинка> уменьшает картинки
+# постов. Варианты кэшируются на диске в MEDIA_ROOT/resized
+POSTS_RESIZE_SIZES = ["480x170", "960x339", "1920x678"]
+# Сколько секунд браузеры и прокси хранят вариант: адрес меняется
+# вместе с содержимым картинки
+POSTS_RESIZE_MAX_AGE = 60 * 60 * 24 * 365
+# manage.py reprocess_media ждет перед каждой пачкой картинок, пока
+# средняя загрузка за минуту выше этого числа; None - не ждать
+POSTS_REPROCESS_MAX_LOAD = os.cpu_count()
+# Сколько постов JSON API отдает за раз (?limit= и ?ids=)
+POSTS_API_MAX_LIMIT = 100
+# Сколько последних постов в RSS/Atom-лентах
+POSTS_FEED_ITEMS = 20
+# Сколько секунд лента хранится в кэше; сбрасывается и раньше, по
+# версии ленты, при сохранении и удалении постов
+POSTS_FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько комментариев на странице поста и в каждой догружаемой пачке
+POSTS_COMMENTS_PER_PAGE = 20